@@ -18,8 +18,7 @@ sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from src.config import hparams as hp
 
-from src.services.wav2lip_pipeline_service import Wav2LipPipelineService
-from src.routes import websocket_router, utility_router, auto_ensure_checkpoints, get_checkpoint_status_summary
+from src.routes import websocket_router, websocket_manager, get_checkpoint_status_summary
 
 # Initialize FastAPI app - Assignment Focused
 app = FastAPI(
@@ -39,7 +38,6 @@ app.add_middleware(
 
 # Include routers - Assignment compliant (WebSocket focused)
 app.include_router(websocket_router, tags=["WebSocket API"])
-app.include_router(utility_router, tags=["Utilities"])
 
 # Configure static files and templates  
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -50,50 +48,7 @@ templates = Jinja2Templates(directory="frontend/templates")
 TEMP_FOLDER = Path("temp")
 TEMP_FOLDER.mkdir(parents=True, exist_ok=True)
 
-# Initialize services (lazy load)
-pipeline_service = None
-face_detection_service = None
-
-def get_services(device='auto'):
-    """Get or initialize services with specific device"""
-    global pipeline_service, face_detection_service
-    
-    if pipeline_service is None or face_detection_service is None:
-        # Auto-ensure checkpoints are available before initializing services
-        logger.info("🔍 Auto-ensuring checkpoints availability...")
-        checkpoint_ready = auto_ensure_checkpoints()
-        
-        if not checkpoint_ready:
-            logger.warning("⚠️ Some checkpoints may be missing, continuing with available models...")
-        
-        # Determine device
-        if device == 'auto':
-            import torch
-            actual_device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        else:
-            actual_device = device
-            
-        logger.info(f'Initializing services with device: {actual_device}')
-        
-        # Initialize face detection service first
-        from src.services.face_detection_service import FaceDetectionService
-        face_detection_service = FaceDetectionService(
-            device=actual_device,
-            batch_size=16
-        )
-        
-        # Initialize pipeline service with external face detection
-        pipeline_service = Wav2LipPipelineService(
-            device=actual_device,
-            face_det_batch_size=16,
-            wav2lip_batch_size=128,
-            result_dir=str(TEMP_FOLDER),
-            external_face_service=face_detection_service
-        )
-        
-        logger.info("✅ Services initialized successfully")
-    
-    return pipeline_service, face_detection_service
+# AI services are owned by the WebSocket manager singleton (lazy load)
 
 # Configure logging
 logger.add("logs/app.log", rotation="1 day", retention="7 days")
@@ -129,7 +84,7 @@ async def health_check():
         "system": {
             "gpu_available": torch.cuda.is_available(),
             "gpu_count": torch.cuda.device_count() if torch.cuda.is_available() else 0,
-            "services_ready": pipeline_service is not None
+            "services_ready": websocket_manager.pipeline_service is not None
         },
         "checkpoints": {
             "auto_management": "✅ Enabled",
@@ -143,6 +98,13 @@ async def health_check():
 async def startup_event():
     """Startup event"""
     logger.info("🚀 Starting ILLUMINUS Wav2Lip - WebSocket-First Architecture")
+    
+    # Pre-warm AI services so the first client doesn't pay the model load
+    try:
+        await websocket_manager.initialize_services()
+    except Exception as e:
+        logger.error(f"❌ Service initialization failed, will retry on the first processing request: {e}")
+    
     logger.info("✅ Application startup completed")
 
 @app.on_event("shutdown")
@@ -151,13 +113,10 @@ async def shutdown_event():
     logger.info("Shutting down ILLUMINUS Wav2Lip application...")
     
     # Cleanup services
-    global pipeline_service, face_detection_service
-    if pipeline_service:
-        pipeline_service.cleanup()
-        pipeline_service = None
-    if face_detection_service:
-        face_detection_service.cleanup()
-        face_detection_service = None
+    if websocket_manager.pipeline_service:
+        websocket_manager.pipeline_service.cleanup()
+    if websocket_manager.face_detection_service:
+        websocket_manager.face_detection_service.cleanup()
     
     logger.info("Application shutdown completed")
 
@@ -174,9 +133,11 @@ if __name__ == "__main__":
             host="0.0.0.0", 
             port=8000,
             loop="uvloop",
-            ws="websockets"
+            ws="websockets",
+            # Compress WebSocket frames (base64 result video + JSON framing)
+            ws_per_message_deflate=True
         )
     except ImportError:
         logger.warning("WebSocket dependencies not found - using basic server")
         logger.warning("Install with: pip install 'uvicorn[standard]' websockets")
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
@@ -61,9 +61,16 @@ class FaceAlignment:
                                           globals(), locals(), [face_detector], 0)
         self.face_detector = face_detector_module.FaceDetector(device=device, verbose=verbose)
 
-    def get_detections_for_batch(self, images):
-        images = images[..., ::-1]
-        detected_faces = self.face_detector.detect_from_batch(images.copy())
+    def get_detections_for_batch(self, images, rgb=False):
+        if rgb:
+            # Caller already swapped channels (fused into its batch copy)
+            detected_faces = self.face_detector.detect_from_batch(images)
+        elif isinstance(images, torch.Tensor):
+            # BGR -> RGB on device
+            detected_faces = self.face_detector.detect_from_batch(images.flip(-1))
+        else:
+            images = images[..., ::-1]
+            detected_faces = self.face_detector.detect_from_batch(images.copy())
         results = []
 
         for i, d in enumerate(detected_faces):
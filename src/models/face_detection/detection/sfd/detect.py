@@ -26,7 +26,7 @@ def detect(net, img, device):
 
     img = torch.from_numpy(img).float().to(device)
     BB, CC, HH, WW = img.size()
-    with torch.no_grad():
+    with torch.inference_mode():
         olist = net(img)
 
     bboxlist = []
@@ -56,21 +56,26 @@ def detect(net, img, device):
     return bboxlist
 
 def batch_detect(net, imgs, device):
-    imgs = imgs - np.array([104, 117, 123])
-    imgs = imgs.transpose(0, 3, 1, 2)
-
     if 'cuda' in device:
         torch.backends.cudnn.benchmark = True
 
-    imgs = torch.from_numpy(imgs).float().to(device)
+    if isinstance(imgs, torch.Tensor):
+        # Frames already decoded on device: normalize without a host round-trip
+        mean = torch.tensor([104., 117., 123.], device=device)
+        imgs = (imgs.to(device).float() - mean).permute(0, 3, 1, 2).contiguous()
+    else:
+        imgs = imgs - np.array([104, 117, 123])
+        imgs = imgs.transpose(0, 3, 1, 2)
+        imgs = torch.from_numpy(imgs).float().to(device)
     BB, CC, HH, WW = imgs.size()
-    with torch.no_grad():
+    with torch.inference_mode():
         olist = net(imgs)
 
     bboxlist = []
     for i in range(len(olist) // 2):
         olist[i * 2] = F.softmax(olist[i * 2], dim=1)
-    olist = [oelem.data.cpu() for oelem in olist]
+    # Outputs may be FP16 under autocast; box decoding runs in FP32 on CPU
+    olist = [oelem.data.float().cpu() for oelem in olist]
     for i in range(len(olist) // 2):
         ocls, oreg = olist[i * 2], olist[i * 2 + 1]
         FB, FC, FH, FW = ocls.size()  # feature map size
@@ -5,6 +5,8 @@ from torch.utils.model_zoo import load_url
 from pathlib import Path
 from loguru import logger
 
+from src.utils.checkpoint_io import load_state_dict
+
 from ..core import FaceDetector
 
 from .net_s3fd import s3fd
@@ -35,7 +37,7 @@ class SFDDetector(FaceDetector):
         if path_to_detector and os.path.isfile(path_to_detector):
             if verbose:
                 print(f"✅ Loading face detection from provided path: {path_to_detector}")
-            model_weights = torch.load(path_to_detector, map_location=device)
+            model_weights = load_state_dict(path_to_detector, device=device)
             checkpoint_used = path_to_detector
         else:
             # Priority 2: Try local checkpoint paths
@@ -43,7 +45,7 @@ class SFDDetector(FaceDetector):
                 if os.path.isfile(local_path):
                     if verbose:
                         print(f"✅ Loading face detection from local checkpoint: {local_path}")
-                    model_weights = torch.load(local_path, map_location=device)
+                    model_weights = load_state_dict(local_path, device=device)
                     checkpoint_used = local_path
                     break
             
@@ -64,7 +66,7 @@ class SFDDetector(FaceDetector):
                             if os.path.isfile(local_path):
                                 if verbose:
                                     print(f"✅ Loading auto-downloaded checkpoint: {local_path}")
-                                model_weights = torch.load(local_path, map_location=device)
+                                model_weights = load_state_dict(local_path, device=device)
                                 checkpoint_used = f"auto-downloaded: {local_path}"
                                 break
                 
@@ -79,7 +79,7 @@ class Wav2LipInferenceImpl:
 
             yield img_batch, mel_batch, frame_batch, coords_batch
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def inference_with_iterator(
         self,
         audio_iterable: Iterable[np.ndarray],
@@ -103,7 +103,7 @@ class Wav2LipInferenceImpl:
                 frame[y1:y2, x1:x2] = pred
                 yield frame
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def forward(self, audio_sequences: torch.Tensor, face_sequences: torch.Tensor) -> torch.Tensor:
         return self.model(audio_sequences, face_sequences)
 
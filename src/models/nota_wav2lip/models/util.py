@@ -4,6 +4,7 @@ import torch
 from pathlib import Path
 from loguru import logger
 
+from src.utils.checkpoint_io import load_state_dict
 from . import NotaWav2Lip, Wav2Lip, Wav2LipBase
 
 MODEL_REGISTRY: Dict[str, Type[Wav2LipBase]] = {
@@ -51,9 +52,7 @@ def _load(checkpoint_path, device):
             raise FileNotFoundError(f"Checkpoint not found: {checkpoint_path}")
     
     logger.info(f"📂 Loading checkpoint from: {checkpoint_path}")
-    if device == 'cuda':
-        return torch.load(str(checkpoint_path))
-    return torch.load(str(checkpoint_path), map_location=lambda storage, _: storage)
+    return load_state_dict(checkpoint_path, device=device)
 
 def load_model(model_name: str, device, checkpoint, **kwargs) -> Wav2LipBase:
 
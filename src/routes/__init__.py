@@ -3,7 +3,6 @@ ILLUMINUS Wav2Lip - API Routes Module (WebSocket-First Architecture)
 
 This module contains WebSocket-focused API route definitions for the assignment:
 - Primary: WebSocket endpoints for real-time lip-syncing
-- Utilities: Health check, status monitoring
 - Checkpoint: Automatic checkpoint management
 - Legacy: Minimal REST support (deprecated for assignment)
 
@@ -13,10 +12,10 @@ Version: 2.0.0 - WebSocket First with Auto-Checkpoint Management
 """
 
 from .websocket_api import router as websocket_router
-from .utility_api import router as utility_router
-from .checkpoint_api import auto_ensure_checkpoints, get_checkpoint_status_summary
+from .websocket_core import websocket_manager
+from .checkpoint_api import auto_ensure_checkpoints, auto_ensure_checkpoints_async, get_checkpoint_status_summary
 
 # Note: checkpoint_router removed - now using auto functions
 # Assignment requires WebSocket-only implementation
 
-__all__ = ["websocket_router", "utility_router", "auto_ensure_checkpoints", "get_checkpoint_status_summary"] 
\ No newline at end of file
+__all__ = ["websocket_router", "websocket_manager", "auto_ensure_checkpoints", "auto_ensure_checkpoints_async", "get_checkpoint_status_summary"] 
\ No newline at end of file
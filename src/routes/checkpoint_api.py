@@ -3,6 +3,8 @@ Checkpoint Auto-Management Functions
 Auto-download checkpoints when missing (no API endpoints)
 """
 
+import asyncio
+
 from loguru import logger
 from src.services.checkpoint_manager import checkpoint_manager
 
@@ -64,6 +66,47 @@ def auto_ensure_checkpoints():
         return False
 
 
+async def auto_ensure_checkpoints_async():
+    """
+    Async version of auto_ensure_checkpoints for the application startup event
+    Downloads run on the event loop (aiohttp); verification runs in the default executor
+    """
+    try:
+        logger.info("🔍 Checking checkpoint availability...")
+        loop = asyncio.get_running_loop()
+        
+        status = await loop.run_in_executor(None, checkpoint_manager.get_checkpoint_status)
+        total_checkpoints = sum(len(cat) for cat in status.values())
+        valid_checkpoints = sum(1 for cat in status.values() for chk in cat.values() if chk['valid'])
+        
+        if valid_checkpoints == total_checkpoints:
+            logger.info(f"✅ All checkpoints ready ({valid_checkpoints}/{total_checkpoints})")
+            return True
+        
+        logger.info(f"🔽 Auto-downloading missing checkpoints ({valid_checkpoints}/{total_checkpoints})...")
+        
+        cleanup_count = await loop.run_in_executor(None, checkpoint_manager.cleanup_invalid_checkpoints)
+        if cleanup_count > 0:
+            logger.info(f"🧹 Cleaned up {cleanup_count} invalid checkpoints")
+        
+        results = await checkpoint_manager.download_all_checkpoints_async(force=False)
+        
+        # Results already reflect deep verification of each checkpoint
+        final_valid = sum(1 for cat in results.values() for ok in cat.values() if ok)
+        success = final_valid == total_checkpoints
+        
+        if success:
+            logger.info(f"✅ Auto-download completed successfully: {final_valid}/{total_checkpoints} ready")
+        else:
+            logger.warning(f"⚠️ Auto-download partially completed: {final_valid}/{total_checkpoints} ready")
+        
+        return success
+        
+    except Exception as e:
+        logger.error(f"❌ Auto-checkpoint setup failed: {e}")
+        return False
+
+
 def get_checkpoint_status_summary():
     """
     Get simple checkpoint status summary for internal use
@@ -1,18 +0,0 @@
-"""
-ILLUMINUS Wav2Lip - Utility Functions
-Essential utility functions (no API endpoints)
-
-Author: Andrew (ngpthanh15@gmail.com)
-Version: 1.0.0
-"""
-
-from fastapi import APIRouter
-from loguru import logger
-
-# Empty router - no utility APIs needed, all handled in main app
-router = APIRouter()
-
-# All utility functions are now handled directly in app.py
-# No separate utility endpoints needed for WebSocket-focused architecture
-
- 
\ No newline at end of file
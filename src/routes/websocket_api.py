@@ -18,6 +18,10 @@ from .websocket_core import websocket_manager
 
 router = APIRouter()
 
+# Hot-path constants (resolved once at import instead of per message)
+_MAX_AUDIO = 50 * 1024 * 1024  # 50MB
+_MAX_IMAGE = 10 * 1024 * 1024  # 10MB
+
 
 @router.websocket("/ws/lip-sync")
 async def websocket_lip_sync(websocket: WebSocket):
@@ -35,18 +39,18 @@ async def websocket_lip_sync(websocket: WebSocket):
             "image_format": "jpg" | "png",
             "pads": [top, bottom, left, right],
             "resize_factor": 1,
-            "nosmooth": false
+            "nosmooth": false,
+            "legacy_base64": true
         }
     }
     
-    Output: base64-encoded video of face talking, lip-synced with input audio
+    Output: base64-encoded video of face talking, lip-synced with input audio.
+    With "legacy_base64": false the result is sent as a "result_header" JSON
+    message followed by the raw MP4 bytes in a binary frame.
     """
     client_id = str(uuid.uuid4())
     
     try:
-        # Initialize services if needed
-        await websocket_manager.initialize_services()
-        
         # Accept and register connection
         await websocket_manager.connect(websocket, client_id)
         
@@ -58,21 +62,9 @@ async def websocket_lip_sync(websocket: WebSocket):
                 message = json.loads(data)
                 message_type = message.get("type")
                 
-                if message_type == "process":
-                    # Assignment requirement: process lip-sync request
-                    await handle_process_request(client_id, message)
-                    
-                elif message_type == "ping":
-                    # Health check ping-pong
-                    await websocket_manager.send_message(client_id, {
-                        "type": "pong",
-                        "timestamp": time.time()
-                    })
-                    
-                elif message_type == "cancel":
-                    # Cancel current processing
-                    await handle_cancel_request(client_id)
-                    
+                handler = _MESSAGE_HANDLERS.get(message_type)
+                if handler is not None:
+                    await handler(client_id, message)
                 else:
                     await websocket_manager.send_error(client_id, 
                         f"Unknown message type: {message_type}",
@@ -144,13 +136,13 @@ async def handle_process_request(client_id: str, message: dict):
             return
             
         # File size limits for assignment
-        if len(audio_data) > 50 * 1024 * 1024:  # 50MB
+        if len(audio_data) > _MAX_AUDIO:
             await websocket_manager.send_error(client_id,
                 "Audio file too large (max 50MB)",
                 "validation_error")
             return
             
-        if len(image_data) > 10 * 1024 * 1024:  # 10MB
+        if len(image_data) > _MAX_IMAGE:
             await websocket_manager.send_error(client_id,
                 "Image file too large (max 10MB)",
                 "validation_error")
@@ -174,7 +166,15 @@ async def handle_process_request(client_id: str, message: dict):
     websocket_manager.processing_tasks[client_id] = task
 
 
-async def handle_cancel_request(client_id: str):
+async def handle_ping_request(client_id: str, message: dict):
+    """Health check ping-pong"""
+    await websocket_manager.send_message(client_id, {
+        "type": "pong",
+        "timestamp": time.time()
+    })
+
+
+async def handle_cancel_request(client_id: str, message: dict = None):
     """Handle processing cancellation request"""
     if client_id in websocket_manager.processing_tasks:
         task = websocket_manager.processing_tasks[client_id]
@@ -192,6 +192,14 @@ async def handle_cancel_request(client_id: str):
         })
 
 
+# Message type -> handler dispatch table
+_MESSAGE_HANDLERS = {
+    "process": handle_process_request,  # Assignment requirement: process lip-sync request
+    "ping": handle_ping_request,
+    "cancel": handle_cancel_request,
+}
+
+
 @router.get("/ws/health")
 async def websocket_health():
     """WebSocket service health check"""
@@ -7,19 +7,112 @@ Version: 2.0.0 - Assignment Optimized
 """
 
 import asyncio
-import base64
+import hashlib
 import json
-import uuid
+import os
+import platform
+import shutil
 import time
 import traceback
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from typing import Dict, Any, Optional
 from fastapi.websockets import WebSocketState
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
 from loguru import logger
+import aiofiles
+
+try:
+    from websockets.exceptions import ConnectionClosed
+    _CLOSED_ERRORS = (WebSocketDisconnect, ConnectionClosed)
+except ImportError:
+    _CLOSED_ERRORS = (WebSocketDisconnect,)
+
+try:
+    # SIMD-accelerated, API-compatible drop-in for the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+try:
+    # SIMD-accelerated JSON serializer, returns UTF-8 bytes directly
+    from orjson import dumps as _dumps
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
 from ..services.wav2lip_pipeline_service import Wav2LipPipelineService
 from ..services.face_detection_service import FaceDetectionService
+from .checkpoint_api import auto_ensure_checkpoints_async
+
+
+def _get_session_root() -> Path:
+    """Scratch directory cho WebSocket jobs: tmpfs (/dev/shm) trên Linux để tránh disk I/O"""
+    shm = Path("/dev/shm")
+    if platform.system() == 'Linux' and shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "illuminus_ws"
+    return Path("temp/websocket")
+
+
+WS_SESSION_ROOT = _get_session_root()
+
+# Progress coalescing: drop updates closer than this interval unless progress moved enough
+_PROGRESS_MIN_INTERVAL = 0.05  # seconds
+_PROGRESS_MIN_DELTA = 1.0  # percent
+
+# LRU bounds for repeat-submission caches (face detection per image, mel chunks per audio)
+_FACE_CACHE_SIZE = 32
+_MEL_CACHE_SIZE = 16
+
+# Read size for streaming base64 encode (multiple of 3 so no mid-stream padding)
+_B64_READ_CHUNK = 3 * 65536
+
+
+def _content_hash(data: bytes) -> bytes:
+    """Cheap 128-bit content fingerprint for cache keys"""
+    return hashlib.blake2s(data, digest_size=16).digest()
+
+
+def _lru_get(cache: OrderedDict, key: Any) -> Any:
+    """Get from an OrderedDict LRU, marking the entry as most recently used"""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _lru_put(cache: OrderedDict, key: Any, value: Any, maxsize: int):
+    """Insert into an OrderedDict LRU, evicting the least recently used entries"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > maxsize:
+        cache.popitem(last=False)
+
+
+def _encode_file_base64(filepath: Path, prefix: bytes = b"", suffix: bytes = b"") -> bytearray:
+    """
+    Stream-encode a file to base64 into a single pre-sized buffer
+
+    The optional prefix/suffix are written around the encoded payload so a
+    complete JSON frame can be built without extra full-size copies.
+    """
+    size = filepath.stat().st_size
+    out = bytearray(len(prefix) + (size + 2) // 3 * 4 + len(suffix))
+    out[:len(prefix)] = prefix
+    pos = len(prefix)
+    
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(_B64_READ_CHUNK)
+            if not chunk:
+                break
+            encoded = base64.b64encode(chunk)
+            out[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+    
+    out[pos:] = suffix
+    return out
 
 
 class WebSocketManager:
@@ -34,13 +127,37 @@ class WebSocketManager:
         self.pipeline_service: Optional[Wav2LipPipelineService] = None
         self.face_detection_service: Optional[FaceDetectionService] = None
         self._services_initialized = False
+        # Last emitted progress per client (for throttling)
+        self._last_progress_ts: Dict[str, float] = {}
+        self._last_progress_value: Dict[str, float] = {}
+        # Pipeline models are shared, so inference runs one job at a time (off the event loop).
+        # Created inside the running loop (Python 3.8 binds asyncio.Lock to the current loop)
+        self._pipeline_lock: Optional[asyncio.Lock] = None
+        # Content-hash keyed caches so repeat image/audio submissions skip S3FD / mel extraction
+        self._face_cache: OrderedDict = OrderedDict()
+        self._mel_cache: OrderedDict = OrderedDict()
         
     async def initialize_services(self, device: str = 'auto'):
-        """Initialize AI services optimized for WebSocket processing"""
+        """
+        Initialize AI services optimized for WebSocket processing
+        
+        Called from the application startup event so checkpoints are ensured and
+        models are loaded before the first client connects. If that fails, the
+        first processing request retries it.
+        """
         if self._services_initialized:
             return
             
         try:
+            loop = asyncio.get_running_loop()
+            if self._pipeline_lock is None:
+                self._pipeline_lock = asyncio.Lock()
+            
+            # Auto-ensure checkpoints are available before initializing services
+            checkpoints_ready = await auto_ensure_checkpoints_async()
+            if not checkpoints_ready:
+                logger.warning("⚠️ Some checkpoints may be missing, continuing with available models...")
+            
             # Determine device
             if device == 'auto':
                 import torch
@@ -53,20 +170,24 @@ class WebSocketManager:
             # Initialize face detection service (optimized for real-time)
             self.face_detection_service = FaceDetectionService(
                 device=actual_device,
-                batch_size=4  # Smaller batch for real-time performance
+                batch_size=4,  # Smaller batch for real-time performance
+                auto_batch_size=False  # Keep it fixed: the GPU is shared with Wav2Lip
             )
             
+            # Create temp directory (page-cache backed when tmpfs is available)
+            WS_SESSION_ROOT.mkdir(parents=True, exist_ok=True)
+            
             # Initialize pipeline service (WebSocket optimized)
             self.pipeline_service = Wav2LipPipelineService(
                 device=actual_device,
                 face_det_batch_size=4,
                 wav2lip_batch_size=32,  # Optimized for real-time
-                result_dir="temp/websocket",
+                result_dir=str(WS_SESSION_ROOT),
                 external_face_service=self.face_detection_service
             )
             
-            # Create temp directory
-            Path("temp/websocket").mkdir(parents=True, exist_ok=True)
+            # Load models now instead of on the first request
+            await loop.run_in_executor(None, self.pipeline_service.warmup)
             
             self._services_initialized = True
             logger.info("✅ WebSocket services initialized successfully")
@@ -106,31 +227,55 @@ class WebSocketManager:
                     await task
                 except asyncio.CancelledError:
                     pass
-            del self.processing_tasks[client_id]
+            self.processing_tasks.pop(client_id, None)
             
         # Remove connection
         if client_id in self.active_connections:
             del self.active_connections[client_id]
+        
+        self._last_progress_ts.pop(client_id, None)
+        self._last_progress_value.pop(client_id, None)
+        
+        # Remove the client's session directory
+        shutil.rmtree(WS_SESSION_ROOT / client_id, ignore_errors=True)
             
         logger.info(f"🔌 WebSocket client disconnected: {client_id}")
     
     async def send_message(self, client_id: str, message: Dict[str, Any]):
         """Send message to specific client with error handling"""
+        return await self.send_text(client_id, _dumps(message).decode('utf-8'))
+    
+    async def send_text(self, client_id: str, text: str):
+        """Send pre-serialized text frame to specific client with error handling"""
         websocket = self.active_connections.get(client_id)
-        if not websocket or websocket.client_state != WebSocketState.CONNECTED:
+        if websocket is None or websocket.client_state is not WebSocketState.CONNECTED:
             return False
             
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_text(text)
             return True
+        except _CLOSED_ERRORS:
+            logger.info(f"Client {client_id} disconnected during message send")
         except Exception as e:
-            error_msg = str(e).lower()
-            if "disconnect" in error_msg or "closed" in error_msg:
-                logger.info(f"Client {client_id} disconnected during message send")
-            else:
-                logger.error(f"Error sending message to {client_id}: {e}")
-            await self.disconnect(client_id)
+            logger.error(f"Error sending message to {client_id}: {e}")
+        await self.disconnect(client_id)
+        return False
+    
+    async def send_bytes(self, client_id: str, data: bytes):
+        """Send binary frame to specific client with error handling"""
+        websocket = self.active_connections.get(client_id)
+        if websocket is None or websocket.client_state is not WebSocketState.CONNECTED:
             return False
+            
+        try:
+            await websocket.send_bytes(data)
+            return True
+        except _CLOSED_ERRORS:
+            logger.info(f"Client {client_id} disconnected during message send")
+        except Exception as e:
+            logger.error(f"Error sending message to {client_id}: {e}")
+        await self.disconnect(client_id)
+        return False
     
     async def send_error(self, client_id: str, error: str, error_type: str = "processing_error"):
         """Send error message to client"""
@@ -142,10 +287,22 @@ class WebSocketManager:
         })
     
     async def send_progress(self, client_id: str, progress: float, message: str = ""):
-        """Send real-time progress update to client"""
+        """Send real-time progress update to client (coalesced under high-frequency reporting)"""
+        progress = min(100, max(0, progress))  # Clamp between 0-100
+        now = time.monotonic()
+        
+        if progress < 100:
+            elapsed = now - self._last_progress_ts.get(client_id, 0.0)
+            delta = abs(progress - self._last_progress_value.get(client_id, -_PROGRESS_MIN_DELTA))
+            if elapsed < _PROGRESS_MIN_INTERVAL and delta < _PROGRESS_MIN_DELTA:
+                return
+        
+        self._last_progress_ts[client_id] = now
+        self._last_progress_value[client_id] = progress
+        
         await self.send_message(client_id, {
             "type": "progress",
-            "progress": min(100, max(0, progress)),  # Clamp between 0-100
+            "progress": progress,
             "message": message,
             "timestamp": time.time()
         })
@@ -158,11 +315,12 @@ class WebSocketManager:
         Output: base64-encoded video
         """
         start_time = time.time()
-        temp_files = []
+        ws_session_dir = WS_SESSION_ROOT / client_id
         
         try:
-            # Ensure services are initialized
+            # Normally done at startup; retried here if startup initialization failed
             if not self._services_initialized:
+                await self.send_progress(client_id, 2, "🚀 Initializing AI services...")
                 await self.initialize_services()
                 
             await self.send_progress(client_id, 5, "🎯 Preparing assignment processing...")
@@ -171,30 +329,23 @@ class WebSocketManager:
             audio_suffix = options.get('audio_format', 'wav')
             image_suffix = options.get('image_format', 'jpg')
             
-            # Fixed paths to prevent memory bloat
-            ws_session_dir = Path("temp/websocket/session")
+            # Fixed names inside a per-client directory (no cross-client races)
             ws_session_dir.mkdir(parents=True, exist_ok=True)
             
             audio_path = ws_session_dir / f"input.{audio_suffix}"
             image_path = ws_session_dir / f"input.{image_suffix}"
             output_path = ws_session_dir / "result.mp4"
             
-            temp_files = [audio_path, image_path, output_path]
-            
             # Generate session ID for tracking (not for file naming)
-            session_id = f"ws_{int(time.time())}_{str(uuid.uuid4())[:8]}"
-            
-            # 🔥 CLEANUP: Remove existing files before saving new ones
-            for cleanup_file in temp_files:
-                cleanup_file.unlink(missing_ok=True)
+            session_id = f"ws_{int(time.time())}_{os.urandom(4).hex()}"
             
             # Save files
             await self.send_progress(client_id, 15, "💾 Saving input files...")
             
-            with open(audio_path, 'wb') as f:
-                f.write(audio_data)
-            with open(image_path, 'wb') as f:
-                f.write(image_data)
+            async with aiofiles.open(audio_path, 'wb') as f:
+                await f.write(audio_data)
+            async with aiofiles.open(image_path, 'wb') as f:
+                await f.write(image_data)
                 
             logger.info(f"WebSocket session {session_id}: Saved files with fixed names")
             logger.info(f"Audio: {len(audio_data)} bytes -> {audio_path}")
@@ -208,28 +359,40 @@ class WebSocketManager:
             
             # Process with AI model
             model_type = options.get('model_type', 'nota_wav2lip')  # Default to faster
+            pads = tuple(options.get('pads', (0, 10, 0, 0)))
+            nosmooth = options.get('nosmooth', False)
+            resize_factor = options.get('resize_factor', 1)
+            
+            # Face detection depends on the image and detection options; mels only on the audio
+            face_key = (_content_hash(image_data), pads, nosmooth, resize_factor)
+            mel_key = _content_hash(audio_data)
             
-            result = self.pipeline_service.process_video_audio(
+            process = partial(
+                self.pipeline_service.process_video_audio,
                 video_path=str(image_path),  # Use image as single frame
                 audio_path=str(audio_path),
                 model_type=model_type,
-                pads=options.get('pads', (0, 10, 0, 0)),
-                nosmooth=options.get('nosmooth', False),
-                resize_factor=options.get('resize_factor', 1),
+                pads=pads,
+                nosmooth=nosmooth,
+                resize_factor=resize_factor,
                 static=True,  # Always static for image input (assignment requirement)
-                output_path=str(output_path)
+                output_path=str(output_path),
+                precomputed_faces=_lru_get(self._face_cache, face_key),
+                precomputed_mel_chunks=_lru_get(self._mel_cache, mel_key)
             )
+            async with self._pipeline_lock:
+                result = await asyncio.get_running_loop().run_in_executor(None, process)
+            
+            # Copy face crops so cached entries don't pin the full decoded frames
+            face_results = [(face.copy(), coords) for face, coords in result.pop('face_results')]
+            _lru_put(self._face_cache, face_key, face_results, _FACE_CACHE_SIZE)
+            _lru_put(self._mel_cache, mel_key, result.pop('mel_chunks'), _MEL_CACHE_SIZE)
             
             await self.send_progress(client_id, 80, "📹 Encoding output video...")
             
-            # Read and encode result video to base64 (assignment requirement)
-            with open(output_path, 'rb') as f:
-                video_bytes = f.read()
-                
-            if len(video_bytes) == 0:
+            video_size = output_path.stat().st_size if output_path.exists() else 0
+            if video_size == 0:
                 raise ValueError("Generated video is empty")
-                
-            video_base64 = base64.b64encode(video_bytes).decode('utf-8')
             
             # Calculate metrics
             processing_time = time.time() - start_time
@@ -238,11 +401,10 @@ class WebSocketManager:
             
             # Send assignment-compliant result
             if client_id in self.active_connections:
-                await self.send_message(client_id, {
+                result_message = {
                     "type": "result",
                     "session_id": session_id,
-                    "video_base64": video_base64,  # Assignment requirement: base64 output
-                    "video_size_bytes": len(video_bytes),
+                    "video_size_bytes": video_size,
                     "processing_time": processing_time,
                     "model_used": model_type,
                     "inference_fps": result.get('inference_fps', 0),
@@ -257,7 +419,25 @@ class WebSocketManager:
                         "websocket_api": "✅"
                     },
                     "timestamp": time.time()
-                })
+                }
+                
+                loop = asyncio.get_running_loop()
+                
+                if options.get('legacy_base64', True):
+                    # Assignment requirement: base64 output. The video is streamed from
+                    # disk straight into the JSON frame as the last "video_base64" field
+                    # (encoded off the event loop so other clients keep receiving updates)
+                    header = _dumps(result_message)[:-1] + b',"video_base64":"'
+                    frame = await loop.run_in_executor(
+                        None, _encode_file_base64, output_path, header, b'"}'
+                    )
+                    await self.send_text(client_id, frame.decode('utf-8'))
+                else:
+                    # Binary mode: metadata header, then the raw MP4 as one binary frame
+                    result_message["type"] = "result_header"
+                    video_bytes = await loop.run_in_executor(None, output_path.read_bytes)
+                    if await self.send_message(client_id, result_message):
+                        await self.send_bytes(client_id, video_bytes)
                 
                 logger.info(f"✅ WebSocket session {session_id} completed in {processing_time:.2f}s")
             else:
@@ -271,11 +451,7 @@ class WebSocketManager:
             
         finally:
             # Cleanup temporary files
-            for temp_file in temp_files:
-                try:
-                    temp_file.unlink(missing_ok=True)
-                except Exception as e:
-                    logger.warning(f"Could not clean up {temp_file}: {e}")
+            shutil.rmtree(ws_session_dir, ignore_errors=True)
             
             # Remove from processing tasks
             if client_id in self.processing_tasks:
@@ -4,14 +4,34 @@ Tự động tải và quản lý tất cả model checkpoints cho ILLUMINUS Wav
 """
 
 import os
+import json
+import asyncio
+import mmap
 import hashlib
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from loguru import logger
 import torch
 from tqdm import tqdm
 
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from src.utils.checkpoint_io import convert_to_safetensors, safetensors_path
+
 
 class CheckpointManager:
     """Service quản lý tự động download và verify checkpoints"""
@@ -45,6 +65,16 @@ class CheckpointManager:
         }
     }
     
+    # Download tuning
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per iter_content round-trip
+    DOWNLOAD_SEGMENTS = 4  # Parallel HTTP Range requests per file
+    MULTIPART_MIN_SIZE = 8 * 1024 * 1024  # Smaller files use a single stream
+    ASYNC_DOWNLOAD_TIMEOUT = 600  # Seconds, total per file (aiohttp)
+    
+    # File signatures của torch checkpoints: zip (PyTorch >= 1.6) hoặc legacy pickle
+    CHECKPOINT_MAGIC_ZIP = b'PK\x03\x04'
+    CHECKPOINT_MAGIC_PICKLE = b'\x80'
+    
     def __init__(self, base_dir: str = "data/checkpoints"):
         """
         Initialize Checkpoint Manager
@@ -59,17 +89,56 @@ class CheckpointManager:
         for category in self.CHECKPOINT_REGISTRY.keys():
             (self.base_dir / category).mkdir(parents=True, exist_ok=True)
         
+        # Checksums của checkpoints đã deep-verify: {relative_path: {'size', 'digest'}}
+        self.checksums_path = self.base_dir / 'checksums.json'
+        self._checksums_lock = threading.Lock()
+        self._checksums: Dict[str, Dict[str, Any]] = self._load_checksums()
+        
+        # Shared HTTP session: keep-alive connection reuse across downloads/segments
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.5)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # In-memory verify results: {path: (mtime_ns, size, valid)}
+        self._verify_cache: Dict[str, Tuple[int, int, bool]] = {}
+        
         logger.info(f"CheckpointManager initialized with base_dir: {self.base_dir}")
     
+    def compute_digest(self, filepath: str, algorithm: str = "blake2b") -> str:
+        """
+        Compute integrity digest của file (không dùng cho mục đích bảo mật)
+        
+        File được mmap và hash trong một lần gọi update() để chạy hoàn toàn trong C.
+        
+        Args:
+            filepath: Path đến file
+            algorithm: 'blake2b' (16-byte digest, mặc định) hoặc tên hashlib khác như 'md5'
+            
+        Returns:
+            Hex digest
+        """
+        if algorithm == "blake2b":
+            hasher = hashlib.blake2b(digest_size=16)
+        else:
+            hasher = hashlib.new(algorithm)
+        
+        with open(filepath, "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    hasher.update(mm)
+        return hasher.hexdigest()
+    
     def compute_md5(self, filepath: str) -> str:
         """Compute MD5 hash của file"""
-        hash_md5 = hashlib.md5()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        return self.compute_digest(filepath, algorithm="md5")
     
-    def download_file(self, url: str, filepath: str, expected_size_mb: Optional[int] = None) -> bool:
+    def download_file(self, url: str, filepath: str, expected_size_mb: Optional[int] = None,
+                      position: Optional[int] = None) -> bool:
         """
         Download file với progress bar và validation
         
@@ -77,6 +146,7 @@ class CheckpointManager:
             url: URL để download
             filepath: Path để save file
             expected_size_mb: Expected file size in MB
+            position: tqdm bar position (cho concurrent downloads)
             
         Returns:
             True nếu download thành công
@@ -88,31 +158,89 @@ class CheckpointManager:
             # Create directory if not exists
             Path(filepath).parent.mkdir(parents=True, exist_ok=True)
             
-            # Download with progress bar
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
+            # Probe size and HTTP Range support; servers that reject HEAD get a plain GET
+            total_size, accepts_ranges = self._probe_range_support(url)
             
-            with open(filepath, 'wb') as f, tqdm(
+            # Download with progress bar
+            with tqdm(
                 desc=Path(filepath).name,
                 total=total_size,
                 unit='B',
                 unit_scale=True,
                 unit_divisor=1024,
+                position=position,
             ) as pbar:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
+                downloaded = False
+                if accepts_ranges and total_size >= self.MULTIPART_MIN_SIZE:
+                    downloaded = self._download_multipart(url, filepath, total_size, pbar)
+                    if not downloaded:
+                        logger.info("Server ignored Range requests, falling back to single stream")
+                        pbar.reset()
+                
+                if not downloaded:
+                    self._download_single_stream(url, filepath, pbar)
+            
+            self._check_downloaded_size(filepath, expected_size_mb)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Download failed: {e}")
+            # Cleanup partial download
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return False
+    
+    async def download_file_async(self, url: str, filepath: str, expected_size_mb: Optional[int] = None,
+                                  position: Optional[int] = None) -> bool:
+        """
+        Download file không block event loop (aiohttp + aiofiles)
+        
+        Fallback về download_file trong executor nếu aiohttp hoặc aiofiles chưa được cài.
+        
+        Args:
+            url: URL để download
+            filepath: Path để save file
+            expected_size_mb: Expected file size in MB
+            position: tqdm bar position (cho concurrent downloads)
             
-            # Validate file size
-            actual_size_mb = Path(filepath).stat().st_size / (1024 * 1024)
-            logger.info(f"✅ Downloaded: {actual_size_mb:.1f} MB")
+        Returns:
+            True nếu download thành công
+        """
+        if aiohttp is None or aiofiles is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, partial(self.download_file, url, filepath, expected_size_mb, position)
+            )
+        
+        try:
+            logger.info(f"🔄 Downloading: {url}")
+            logger.info(f"📁 Saving to: {filepath}")
             
-            if expected_size_mb and abs(actual_size_mb - expected_size_mb) > 1:
-                logger.warning(f"⚠️ Size mismatch: expected {expected_size_mb}MB, got {actual_size_mb:.1f}MB")
+            Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+            
+            timeout = aiohttp.ClientTimeout(total=self.ASYNC_DOWNLOAD_TIMEOUT)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    total_size = response.content_length or 0
+                    
+                    with tqdm(
+                        desc=Path(filepath).name,
+                        total=total_size,
+                        unit='B',
+                        unit_scale=True,
+                        unit_divisor=1024,
+                        position=position,
+                    ) as pbar:
+                        async with aiofiles.open(filepath, 'wb') as f:
+                            if total_size > 0:
+                                # Pre-size so the filesystem allocates extents up front
+                                await f.truncate(total_size)
+                            async for chunk in response.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                                await f.write(chunk)
+                                pbar.update(len(chunk))
             
+            self._check_downloaded_size(filepath, expected_size_mb)
             return True
             
         except Exception as e:
@@ -122,13 +250,118 @@ class CheckpointManager:
                 os.remove(filepath)
             return False
     
-    def verify_checkpoint(self, category: str, name: str) -> bool:
+    def _check_downloaded_size(self, filepath: str, expected_size_mb: Optional[int]):
+        """Log downloaded size và cảnh báo nếu lệch so với registry"""
+        actual_size_mb = Path(filepath).stat().st_size / (1024 * 1024)
+        logger.info(f"✅ Downloaded: {actual_size_mb:.1f} MB")
+        
+        if expected_size_mb and abs(actual_size_mb - expected_size_mb) > 1:
+            logger.warning(f"⚠️ Size mismatch: expected {expected_size_mb}MB, got {actual_size_mb:.1f}MB")
+    
+    def _probe_range_support(self, url: str) -> Tuple[int, bool]:
+        """
+        HEAD request để lấy file size và HTTP Range support
+        
+        Returns:
+            (total_size, accepts_ranges); (0, False) nếu HEAD lỗi hoặc không có Content-Length
+        """
+        try:
+            head = self.session.head(url, allow_redirects=True)
+            head.raise_for_status()
+        except Exception as e:
+            logger.info(f"HEAD request failed ({e}), downloading as a single stream")
+            return 0, False
+        
+        total_size = int(head.headers.get('content-length', 0) or 0)
+        accepts_ranges = head.headers.get('accept-ranges', '').lower() == 'bytes'
+        return total_size, accepts_ranges and total_size > 0
+    
+    def _download_single_stream(self, url: str, filepath: str, pbar: tqdm):
+        """Download toàn bộ file qua một HTTP connection"""
+        response = self.session.get(url, stream=True)
+        response.raise_for_status()
+        
+        total_size = int(response.headers.get('content-length', 0))
+        if total_size > 0 and not pbar.total:
+            pbar.total = total_size
+            pbar.refresh()
+        
+        # Unbuffered: urllib3 already buffers, chunks go straight to write()
+        with open(filepath, 'wb', buffering=0) as f:
+            if total_size > 0:
+                # Pre-size so the filesystem allocates extents up front
+                f.truncate(total_size)
+            for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    pbar.update(len(chunk))
+    
+    def _download_multipart(self, url: str, filepath: str, total_size: int, pbar: tqdm) -> bool:
+        """
+        Download file bằng parallel HTTP Range requests vào file đã pre-allocate
+        
+        Returns:
+            False nếu server không trả về 206 Partial Content
+        """
+        with open(filepath, 'wb') as f:
+            f.truncate(total_size)
+        
+        part_size = -(-total_size // self.DOWNLOAD_SEGMENTS)
+        ranges = [(start, min(start + part_size, total_size) - 1)
+                  for start in range(0, total_size, part_size)]
+        
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(self._download_range, url, filepath, start, end, pbar)
+                       for start, end in ranges]
+            return all([future.result() for future in futures])
+    
+    def _download_range(self, url: str, filepath: str, start: int, end: int, pbar: tqdm) -> bool:
+        """Download byte range [start, end] và ghi vào đúng offset trong file"""
+        response = self.session.get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True)
+        response.raise_for_status()
+        
+        if response.status_code != 206:
+            response.close()
+            return False
+        
+        with open(filepath, 'r+b', buffering=0) as f:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    pbar.update(len(chunk))
+        return True
+    
+    def _load_checksums(self) -> Dict[str, Dict[str, Any]]:
+        """Load persisted checksums (empty nếu chưa có hoặc file hỏng)"""
+        try:
+            with open(self.checksums_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _record_checksum(self, relative_path: str, filepath: Path):
+        """Compute và persist checksum của checkpoint vừa deep-verify"""
+        entry = {
+            'size': filepath.stat().st_size,
+            'digest': self.compute_digest(str(filepath))
+        }
+        with self._checksums_lock:
+            self._checksums[relative_path] = entry
+            with open(self.checksums_path, 'w') as f:
+                json.dump(self._checksums, f, indent=2)
+    
+    def verify_checkpoint(self, category: str, name: str, deep: bool = False) -> bool:
         """
         Verify if checkpoint exists and is valid
         
+        Lightweight check (không side effects): file signature + size so với lần deep-verify trước.
+        Deep check (deep=True, sau khi download): torch.load, ghi safetensors sidecar và checksum.
+        
         Args:
             category: Checkpoint category (face_detection, wav2lip)
             name: Checkpoint name
+            deep: Force full torch.load verification (dùng sau khi download)
             
         Returns:
             True if checkpoint is valid
@@ -148,16 +381,51 @@ class CheckpointManager:
             logger.warning(f"⚠️ Checkpoint not found: {filepath}")
             return False
         
-        # Check if file is loadable by torch
-        try:
-            torch.load(str(filepath), map_location='cpu')
+        # Skip re-verification while the file is unchanged
+        st = filepath.stat()
+        cache_key = str(filepath)
+        if not deep and self._verify_cache.get(cache_key) == (st.st_mtime_ns, st.st_size, True):
+            return True
+        
+        valid = self._verify_checkpoint_file(checkpoint_info['path'], filepath, deep)
+        self._verify_cache[cache_key] = (st.st_mtime_ns, st.st_size, valid)
+        return valid
+    
+    def _verify_checkpoint_file(self, relative_path: str, filepath: Path, deep: bool) -> bool:
+        """Run signature/size (hoặc torch.load khi deep) verification cho một checkpoint file"""
+        # Check file signature (header only)
+        with open(filepath, 'rb') as f:
+            magic = f.read(4)
+        if not (magic == self.CHECKPOINT_MAGIC_ZIP or magic.startswith(self.CHECKPOINT_MAGIC_PICKLE)):
+            logger.error(f"❌ Checkpoint corrupted: {filepath} - unknown file signature")
+            return False
+        
+        if not deep:
+            # Compare against the size recorded at the last deep verification (no hashing, no writes)
+            recorded = self._checksums.get(relative_path)
+            if recorded is not None and filepath.stat().st_size != recorded['size']:
+                logger.error(f"❌ Checkpoint corrupted: {filepath} - size mismatch")
+                return False
             logger.info(f"✅ Checkpoint valid: {filepath}")
             return True
+        
+        # Check if file is loadable by torch
+        try:
+            state_dict = torch.load(str(filepath), map_location='cpu')
         except Exception as e:
             logger.error(f"❌ Checkpoint corrupted: {filepath} - {e}")
             return False
+        
+        # Write a safetensors sidecar so model loading can mmap weights (zero-copy)
+        convert_to_safetensors(state_dict, filepath)
+        del state_dict
+        
+        self._record_checksum(relative_path, filepath)
+        logger.info(f"✅ Checkpoint valid: {filepath}")
+        return True
     
-    def download_checkpoint(self, category: str, name: str, force: bool = False) -> bool:
+    def download_checkpoint(self, category: str, name: str, force: bool = False,
+                            position: Optional[int] = None) -> bool:
         """
         Download specific checkpoint
         
@@ -165,6 +433,7 @@ class CheckpointManager:
             category: Checkpoint category
             name: Checkpoint name
             force: Force re-download even if exists
+            position: tqdm bar position (cho concurrent downloads)
             
         Returns:
             True if successful
@@ -185,16 +454,74 @@ class CheckpointManager:
         filepath = self.base_dir / checkpoint_info['path']
         
         logger.info(f"🔽 Downloading {checkpoint_info['description']}")
+        self._verify_cache.pop(str(filepath), None)
         
         success = self.download_file(
             url=checkpoint_info['url'],
             filepath=str(filepath),
-            expected_size_mb=checkpoint_info['size_mb']
+            expected_size_mb=checkpoint_info['size_mb'],
+            position=position
         )
         
         if success:
             # Verify downloaded file
-            if self.verify_checkpoint(category, name):
+            if self.verify_checkpoint(category, name, deep=True):
+                logger.info(f"✅ Successfully downloaded and verified: {category}/{name}")
+                return True
+            else:
+                logger.error(f"❌ Downloaded file failed verification: {category}/{name}")
+                return False
+        
+        return False
+    
+    async def download_checkpoint_async(self, category: str, name: str, force: bool = False,
+                                        position: Optional[int] = None) -> bool:
+        """
+        Async version của download_checkpoint (dùng từ startup handler)
+        
+        Verification (hash/torch.load) chạy trong executor để không block event loop.
+        
+        Args:
+            category: Checkpoint category
+            name: Checkpoint name
+            force: Force re-download even if exists
+            position: tqdm bar position (cho concurrent downloads)
+            
+        Returns:
+            True if successful
+        """
+        loop = asyncio.get_running_loop()
+        
+        if not force and await loop.run_in_executor(None, self.verify_checkpoint, category, name):
+            logger.info(f"✅ Checkpoint already exists: {category}/{name}")
+            return True
+        
+        if category not in self.CHECKPOINT_REGISTRY:
+            logger.error(f"Unknown category: {category}")
+            return False
+        
+        if name not in self.CHECKPOINT_REGISTRY[category]:
+            logger.error(f"Unknown checkpoint: {category}/{name}")
+            return False
+        
+        checkpoint_info = self.CHECKPOINT_REGISTRY[category][name]
+        filepath = self.base_dir / checkpoint_info['path']
+        
+        logger.info(f"🔽 Downloading {checkpoint_info['description']}")
+        self._verify_cache.pop(str(filepath), None)
+        
+        success = await self.download_file_async(
+            url=checkpoint_info['url'],
+            filepath=str(filepath),
+            expected_size_mb=checkpoint_info['size_mb'],
+            position=position
+        )
+        
+        if success:
+            verified = await loop.run_in_executor(
+                None, partial(self.verify_checkpoint, category, name, deep=True)
+            )
+            if verified:
                 logger.info(f"✅ Successfully downloaded and verified: {category}/{name}")
                 return True
             else:
@@ -213,18 +540,26 @@ class CheckpointManager:
         Returns:
             Status dictionary
         """
-        results = {}
+        results = {category: {} for category in self.CHECKPOINT_REGISTRY}
         
         logger.info("🚀 Starting automatic checkpoint download...")
         
-        for category, checkpoints in self.CHECKPOINT_REGISTRY.items():
-            results[category] = {}
-            
-            for name, info in checkpoints.items():
+        # 🔥 OPTIMIZATION: Download independent checkpoints concurrently
+        jobs = [(category, name) for category, checkpoints in self.CHECKPOINT_REGISTRY.items()
+                for name in checkpoints]
+        
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = {}
+            for position, (category, name) in enumerate(jobs):
+                info = self.CHECKPOINT_REGISTRY[category][name]
                 logger.info(f"📥 Processing {category}/{name}: {info['description']}")
-                
+                future = executor.submit(self.download_checkpoint, category, name, force, position)
+                futures[future] = (category, name)
+            
+            for future in as_completed(futures):
+                category, name = futures[future]
                 try:
-                    success = self.download_checkpoint(category, name, force=force)
+                    success = future.result()
                     results[category][name] = success
                     
                     if success:
@@ -236,7 +571,48 @@ class CheckpointManager:
                     logger.error(f"❌ Error downloading {category}/{name}: {e}")
                     results[category][name] = False
         
-        # Summary
+        self._log_download_summary(results)
+        return results
+    
+    async def download_all_checkpoints_async(self, force: bool = False) -> Dict[str, Dict[str, bool]]:
+        """
+        Download all required checkpoints concurrently via asyncio.gather
+        
+        Args:
+            force: Force re-download all checkpoints
+            
+        Returns:
+            Status dictionary
+        """
+        results = {category: {} for category in self.CHECKPOINT_REGISTRY}
+        
+        logger.info("🚀 Starting automatic checkpoint download...")
+        
+        jobs = [(category, name) for category, checkpoints in self.CHECKPOINT_REGISTRY.items()
+                for name in checkpoints]
+        
+        outcomes = await asyncio.gather(
+            *[self.download_checkpoint_async(category, name, force, position)
+              for position, (category, name) in enumerate(jobs)],
+            return_exceptions=True
+        )
+        
+        for (category, name), outcome in zip(jobs, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"❌ Error downloading {category}/{name}: {outcome}")
+                results[category][name] = False
+            elif outcome:
+                logger.info(f"✅ {category}/{name} ready")
+                results[category][name] = True
+            else:
+                logger.error(f"❌ {category}/{name} failed")
+                results[category][name] = False
+        
+        self._log_download_summary(results)
+        return results
+    
+    def _log_download_summary(self, results: Dict[str, Dict[str, bool]]):
+        """Log tổng kết sau khi download checkpoints"""
         total_checkpoints = sum(len(c) for c in self.CHECKPOINT_REGISTRY.values())
         successful = sum(1 for category in results.values() for status in category.values() if status)
         
@@ -246,8 +622,6 @@ class CheckpointManager:
             logger.info("🎉 All checkpoints ready!")
         else:
             logger.warning(f"⚠️ {total_checkpoints - successful} checkpoints failed to download")
-        
-        return results
     
     def get_checkpoint_status(self) -> Dict[str, Dict[str, Dict[str, any]]]:
         """Get detailed status of all checkpoints"""
@@ -290,6 +664,7 @@ class CheckpointManager:
                     logger.info(f"🗑️ Removing invalid checkpoint: {filepath}")
                     try:
                         filepath.unlink()
+                        safetensors_path(filepath).unlink(missing_ok=True)
                         removed += 1
                     except Exception as e:
                         logger.error(f"Error removing {filepath}: {e}")
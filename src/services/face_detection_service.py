@@ -8,33 +8,72 @@ import cv2
 import numpy as np
 import torch
 import sys
-from typing import List, Tuple, Optional, Union
+from typing import Iterable, Iterator, List, Tuple, Optional, Union
 from pathlib import Path
 from loguru import logger
 
 # Import face_detection from models
 from src.models import face_detection
 
+try:
+    from torchvision.ops import roi_align
+except ImportError:
+    roi_align = None
+
+
+def _save_faulty(frame: np.ndarray, index: int, path: str = 'temp/faulty_frame.jpg'):
+    """Save frame không detect được face để debug (chỉ chạy trên error path)"""
+    faulty_path = Path(path)
+    faulty_path.parent.mkdir(exist_ok=True)
+    cv2.imwrite(str(faulty_path), frame)
+    logger.info(f"Saved faulty frame {index} to: {faulty_path}")
+
 
 class FaceDetectionService:
     """Service xử lý face detection với batch processing"""
     
+    # Batch size autotuning (CUDA only)
+    MAX_AUTOTUNE_BATCH = 64
+    AUTOTUNE_MEMORY_FRACTION = 0.8  # Fraction của free VRAM dành cho detection batch
+    GROW_AFTER_BATCHES = 8  # Consecutive clean batches trước khi tăng lại batch size
+    GROW_MEMORY_FRACTION = 0.6  # Chỉ tăng khi allocated < fraction của total VRAM
+    
+    # Per-call progress logs chỉ cho clips dài (tránh log overhead với nhiều clips ngắn)
+    LOG_MIN_FRAMES = 100
+    
     def __init__(self, 
                  device: str = 'cuda',
                  batch_size: int = 16,
-                 checkpoint_path: str = "data/checkpoints/face_detection/s3fd-619a316812.pth"):
+                 checkpoint_path: str = "data/checkpoints/face_detection/s3fd-619a316812.pth",
+                 auto_batch_size: bool = True,
+                 stride: int = 1):
         """
         Initialize Face Detection Service
         
         Args:
             device: Device để chạy inference ('cuda' hoặc 'cpu')
-            batch_size: Batch size cho face detection
+            batch_size: Batch size cho face detection (khởi đầu, trước khi autotune)
             checkpoint_path: Path đến face detection checkpoint
+            auto_batch_size: Tự chọn batch size lớn nhất vừa free VRAM
+            stride: Chỉ detect mỗi stride frames và interpolate boxes ở giữa
+                    (1 = detect mọi frame; 3 recommended cho talking-head video)
         """
         self.device = device
         self.batch_size = batch_size
         self.checkpoint_path = checkpoint_path
+        self.auto_batch_size = auto_batch_size
+        self.stride = max(1, stride)
         self.detector = None
+        self.use_fp16 = False  # Set khi detector chạy trên GPU có FP16 tensor cores
+        
+        # Autotune state: ceiling per frame shape, clean batches since last OOM/grow
+        self._batch_ceiling: Optional[int] = None
+        self._autotuned_shape: Optional[Tuple[int, ...]] = None
+        self._clean_batches = 0
+        
+        # Double-buffered pinned host staging for H2D batch copies (allocated on first use)
+        self._host_bufs: List[Optional[torch.Tensor]] = [None, None]
+        self._host_buf_events: List[Optional[torch.cuda.Event]] = [None, None]
         
         # Validate checkpoint
         if not os.path.exists(checkpoint_path):
@@ -95,7 +134,12 @@ class FaceDetectionService:
                         device=device,
                         verbose=True  # 🔥 Enable verbose to see checkpoint loading
                     )
-                    logger.info("✅ Face detector initialized successfully")
+                    # Inference only: no autograd state on S3FD parameters
+                    self.detector.face_detector.face_detector.eval().requires_grad_(False)
+                    
+                    # 🔥 OPTIMIZATION: FP16 autocast on Volta+ (halves conv memory traffic)
+                    self.use_fp16 = device == 'cuda' and torch.cuda.get_device_capability()[0] >= 7
+                    logger.info(f"✅ Face detector initialized successfully (fp16={self.use_fp16})")
                     
                 finally:
                     # Restore original environment variables
@@ -114,77 +158,372 @@ class FaceDetectionService:
                 logger.error(f"Device: {self.device}, Checkpoint: {self.checkpoint_path}")
                 raise e
     
-    def detect_faces_batch(self, images: List[np.ndarray]) -> List[Optional[Tuple[int, int, int, int]]]:
+    def _prefetch_to_device(self, batches: Iterable[Union[np.ndarray, torch.Tensor]]) -> Iterator[Union[np.ndarray, torch.Tensor]]:
+        """
+        Copy batch i+1 host->device trên side stream trong khi batch i đang detect
+        
+        Host frames được copy thẳng vào pinned staging buffer (không np.array
+        intermediate) để async copy thực sự overlap với compute.
+        Batches yield ra đã ở RGB: BGR->RGB swap được fuse vào copy đó.
+        """
+        device = self.detector.device
+        if 'cuda' not in device or not torch.cuda.is_available():
+            for batch in batches:
+                yield self._to_rgb_batch(batch)
+            return
+        
+        copy_stream = torch.cuda.Stream()
+        pending = None
+        for index, batch in enumerate(batches):
+            if isinstance(batch, torch.Tensor) and batch.is_cuda:
+                copied = (batch.flip(-1), None)
+            else:
+                slot = index % 2
+                host = self._stage_host_batch(slot, batch)
+                with torch.cuda.stream(copy_stream):
+                    device_batch = host.to(device, non_blocking=True)
+                    ready = torch.cuda.Event()
+                    ready.record(copy_stream)
+                # Slot is refilled only after this copy has completed
+                self._host_buf_events[slot] = ready
+                copied = (device_batch, ready)
+            
+            if pending is not None:
+                yield self._wait_for_copy(pending)
+            pending = copied
+        
+        if pending is not None:
+            yield self._wait_for_copy(pending)
+    
+    def _wait_for_copy(self, copied) -> torch.Tensor:
+        """Make compute stream chờ H2D copy của batch xong"""
+        device_batch, ready = copied
+        if ready is not None:
+            compute_stream = torch.cuda.current_stream()
+            compute_stream.wait_event(ready)
+            device_batch.record_stream(compute_stream)
+        return device_batch
+    
+    def _run_detector(self, batch: Union[np.ndarray, torch.Tensor], rgb: bool = False) -> List[Optional[Tuple[int, int, int, int]]]:
+        """Chạy S3FD trên một batch (BGR, hoặc RGB nếu rgb=True), dưới FP16 autocast khi được bật"""
+        with torch.cuda.amp.autocast(enabled=self.use_fp16):
+            return self.detector.get_detections_for_batch(batch, rgb=rgb)
+    
+    def _to_rgb_batch(self, batch: Union[List[np.ndarray], np.ndarray, torch.Tensor]) -> Union[np.ndarray, torch.Tensor]:
+        """Stack BGR frames thành RGB batch trong một lần copy"""
+        if isinstance(batch, torch.Tensor):
+            return batch.flip(-1)
+        
+        rgb = np.empty((len(batch),) + tuple(batch[0].shape), dtype=np.uint8)
+        if isinstance(batch, np.ndarray):
+            np.copyto(rgb, batch[..., ::-1])
+        else:
+            for j, frame in enumerate(batch):
+                np.copyto(rgb[j], frame[..., ::-1])
+        return rgb
+    
+    def _stage_host_batch(self, slot: int, batch: Union[List[np.ndarray], np.ndarray, torch.Tensor]) -> torch.Tensor:
+        """
+        Copy frames của batch (BGR) vào pinned host buffer của slot dưới dạng RGB
+        
+        Buffer được reuse giữa các batches/calls và chỉ re-allocate khi frame shape
+        đổi hoặc batch lớn hơn capacity.
+        
+        Returns:
+            Pinned uint8 tensor view [B, H, W, 3]
+        """
+        count = len(batch)
+        frame_shape = tuple(batch[0].shape)
+        
+        buf = self._host_bufs[slot]
+        if buf is None or tuple(buf.shape[1:]) != frame_shape or buf.shape[0] < count:
+            capacity = max(count, self.batch_size)
+            buf = torch.empty((capacity,) + frame_shape, dtype=torch.uint8).pin_memory()
+            self._host_bufs[slot] = buf
+            self._host_buf_events[slot] = None
+        elif self._host_buf_events[slot] is not None:
+            # Previous H2D copy from this slot must finish before overwriting it
+            self._host_buf_events[slot].synchronize()
+        
+        # Channel swap rides along with the staging memcpy
+        staged = buf[:count]
+        if isinstance(batch, torch.Tensor):
+            staged.copy_(batch.flip(-1))
+        elif isinstance(batch, np.ndarray):
+            np.copyto(staged.numpy(), batch[..., ::-1])
+        else:
+            staged_np = staged.numpy()
+            for j, frame in enumerate(batch):
+                np.copyto(staged_np[j], frame[..., ::-1])
+        return staged
+    
+    @torch.inference_mode()
+    def _autotune_batch(self, sample: Union[List[np.ndarray], torch.Tensor]):
+        """
+        Chọn batch size từ memory của một detection pass trên một frame
+        
+        max_batch = free VRAM * AUTOTUNE_MEMORY_FRACTION / per-sample memory, tune lại khi frame shape đổi.
+        
+        Args:
+            sample: Batch chứa một frame (list hoặc tensor [1, H, W, 3])
+        """
+        device = self.detector.device
+        if not self.auto_batch_size or 'cuda' not in device or not torch.cuda.is_available():
+            return
+        
+        shape = tuple(sample[0].shape)
+        if self._batch_ceiling is not None and shape == self._autotuned_shape:
+            return
+        
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        baseline = torch.cuda.memory_allocated()
+        
+        probe = sample if isinstance(sample, torch.Tensor) else np.array(sample)
+        try:
+            self._run_detector(probe)
+        except RuntimeError as e:
+            # Not even one frame fits right now: keep the current batch size for this shape
+            logger.warning(f'Face detection batch autotune failed, keeping batch size {self.batch_size}: {e}')
+            torch.cuda.empty_cache()
+            self._batch_ceiling = self.batch_size
+            self._autotuned_shape = shape
+            return
+        
+        torch.cuda.synchronize()
+        per_sample = max(torch.cuda.max_memory_allocated() - baseline, 1)
+        free_memory, _ = torch.cuda.mem_get_info()
+        
+        ceiling = int(free_memory * self.AUTOTUNE_MEMORY_FRACTION / per_sample)
+        self._batch_ceiling = max(1, min(self.MAX_AUTOTUNE_BATCH, ceiling))
+        self._autotuned_shape = shape
+        self._clean_batches = 0
+        self.batch_size = self._batch_ceiling
+        
+        logger.info(f"🔥 Autotuned face detection batch size: {self.batch_size} "
+                    f"(frame {shape}, {per_sample / 1024 ** 2:.1f} MB/sample)")
+    
+    def _record_clean_batch(self):
+        """Tăng lại batch size (x2, tới ceiling) sau nhiều batches liên tiếp không OOM"""
+        if self._batch_ceiling is None or self.batch_size >= self._batch_ceiling:
+            return
+        
+        self._clean_batches += 1
+        if self._clean_batches < self.GROW_AFTER_BATCHES:
+            return
+        
+        total_memory = torch.cuda.get_device_properties(torch.cuda.current_device()).total_memory
+        if torch.cuda.memory_allocated() < self.GROW_MEMORY_FRACTION * total_memory:
+            self.batch_size = min(self.batch_size * 2, self._batch_ceiling)
+            logger.info(f"Face detection batch size grown to {self.batch_size}")
+        self._clean_batches = 0
+    
+    def _iter_batches(self, images: Union[List[np.ndarray], torch.Tensor]) -> Iterator[Union[List[np.ndarray], torch.Tensor]]:
+        """Chia images thành batches, đọc self.batch_size mỗi bước để batch size có thể tăng giữa chừng"""
+        i = 0
+        while i < len(images):
+            size = self.batch_size
+            yield images[i:i + size]
+            i += size
+    
+    @torch.inference_mode()
+    def detect_faces_batch(self, images: Union[List[np.ndarray], np.ndarray, torch.Tensor],
+                           stride: Optional[int] = None) -> List[Optional[Tuple[int, int, int, int]]]:
         """
         Detect faces trong batch images với retry mechanism
         
         Args:
-            images: List các frames (BGR format)
+            images: List các frames (BGR format), hoặc uint8 tensor [N, H, W, 3]
+                    đã nằm trên device (không cần copy)
+            stride: Override self.stride cho call này
             
         Returns:
             List các bounding boxes (x1, y1, x2, y2) hoặc None nếu không detect được
         """
-        self._initialize_detector()
+        stride = self.stride if stride is None else stride
+        if stride > 1 and len(images) > stride:
+            return self._detect_strided(images, stride)
+        
+        if self.detector is None:
+            self._initialize_detector()
         
-        batch_size = self.batch_size
+        if len(images) > 0:
+            self._autotune_batch(images[:1])
         
         while True:
             predictions = []
             try:
-                # Process in batches
-                for i in range(0, len(images), batch_size):
-                    batch = np.array(images[i:i + batch_size])
-                    batch_predictions = self.detector.get_detections_for_batch(batch)
+                # Process in batches (next batch copied to device while current one runs)
+                for batch in self._prefetch_to_device(self._iter_batches(images)):
+                    batch_predictions = self._run_detector(batch, rgb=True)
                     predictions.extend(batch_predictions)
+                    self._record_clean_batch()
                 break
                 
             except RuntimeError as e:
-                if batch_size == 1:
+                if self.batch_size == 1:
                     logger.error(f"Image too big for face detection: {e}")
                     raise RuntimeError('Image too big to run face detection on GPU. Please use --resize_factor argument')
                 
-                batch_size //= 2
-                logger.warning(f'Recovering from OOM error; New batch size: {batch_size}')
+                # Persist the smaller size; _record_clean_batch grows it back later
+                self.batch_size //= 2
+                self._clean_batches = 0
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                logger.warning(f'Recovering from OOM error; New batch size: {self.batch_size}')
                 continue
         
         return predictions
     
-    def get_smoothened_boxes(self, boxes: List[Tuple[int, int, int, int]], T: int = 5) -> List[Tuple[int, int, int, int]]:
+    def _detect_strided(self, images: Union[List[np.ndarray], np.ndarray, torch.Tensor],
+                        stride: int) -> List[Optional[Tuple[int, int, int, int]]]:
+        """
+        Detect trên anchor frames (mỗi stride frames + frame cuối), interpolate boxes ở giữa
+        
+        Frames có anchor kề bên không detect được face sẽ được detect trực tiếp.
+        """
+        n = len(images)
+        anchor_idx = np.arange(0, n, stride)
+        if anchor_idx[-1] != n - 1:
+            anchor_idx = np.append(anchor_idx, n - 1)
+        
+        anchor_boxes = self.detect_faces_batch(self._select_frames(images, anchor_idx), stride=1)
+        anchor_valid = np.array([box is not None for box in anchor_boxes])
+        anchor_arr = np.array([box if box is not None else (0, 0, 0, 0) for box in anchor_boxes], dtype=np.float64)
+        
+        # Bracketing anchors a <= i <= b for every frame
+        frame_idx = np.arange(n)
+        right = np.clip(np.searchsorted(anchor_idx, frame_idx), 1, len(anchor_idx) - 1)
+        left = right - 1
+        a, b = anchor_idx[left], anchor_idx[right]
+        weight = ((frame_idx - a) / (b - a))[:, None]
+        boxes = np.rint(anchor_arr[left] + weight * (anchor_arr[right] - anchor_arr[left])).astype(np.int64)
+        
+        predictions: List[Optional[Tuple[int, int, int, int]]] = [tuple(box) for box in boxes.tolist()]
+        predictions_valid = anchor_valid[left] & anchor_valid[right]
+        
+        # Anchors keep their own detection (including None)
+        for k, i in enumerate(anchor_idx.tolist()):
+            predictions[i] = anchor_boxes[k]
+        
+        # Non-anchor frames next to a failed anchor: detect them directly
+        is_anchor = np.zeros(n, dtype=bool)
+        is_anchor[anchor_idx] = True
+        redo_idx = np.flatnonzero(~predictions_valid & ~is_anchor)
+        if len(redo_idx) > 0:
+            redo_boxes = self.detect_faces_batch(self._select_frames(images, redo_idx), stride=1)
+            for i, box in zip(redo_idx.tolist(), redo_boxes):
+                predictions[i] = box
+        
+        return predictions
+    
+    def _select_frames(self, images: Union[List[np.ndarray], np.ndarray, torch.Tensor],
+                       indices: np.ndarray) -> Union[List[np.ndarray], np.ndarray, torch.Tensor]:
+        """Lấy subset frames theo indices, giữ nguyên kiểu container"""
+        if isinstance(images, torch.Tensor):
+            return images[torch.as_tensor(indices, device=images.device)]
+        if isinstance(images, np.ndarray):
+            return images[indices]
+        return [images[i] for i in indices.tolist()]
+    
+    def detect_faces_stream(self, batches: Iterable[np.ndarray]) -> List[Optional[Tuple[int, int, int, int]]]:
+        """
+        Detect faces trên frame batches khi chúng được decode (producer/consumer)
+        
+        Args:
+            batches: Iterable các frame batches [B, H, W, 3] (BGR), ví dụ từ
+                     VideoProcessingService.stream_frames
+            
+        Returns:
+            List các bounding boxes (x1, y1, x2, y2) hoặc None, theo thứ tự frames
+        """
+        predictions = []
+        for batch_predictions in self._iter_stream_detections(batches):
+            predictions.extend(batch_predictions)
+        return predictions
+    
+    @torch.inference_mode()
+    def _iter_stream_detections(self, batches: Iterable[np.ndarray]) -> Iterator[List[Optional[Tuple[int, int, int, int]]]]:
+        """Yield detections cho từng batch ngay khi batch đó chạy xong"""
+        if self.stride > 1:
+            # Strided detection needs whole batches on the host to pick anchors
+            for batch in batches:
+                yield self.detect_faces_batch(batch)
+            return
+        
+        if self.detector is None:
+            self._initialize_detector()
+        
+        first = True
+        for batch in self._prefetch_to_device(batches):
+            if first:
+                # Tune for later clips; this stream's batch size is fixed by the decoder
+                self._autotune_batch(batch[:1])
+                first = False
+            try:
+                batch_predictions = self._run_detector(batch, rgb=True)
+                self._record_clean_batch()
+            except RuntimeError as e:
+                # Batch too large: redo just this batch with the halving retry
+                logger.warning(f'Recovering from OOM error on streamed batch: {e}')
+                # Prefetched batches are RGB; detect_faces_batch expects BGR frames
+                batch = batch.flip(-1).cpu().numpy() if isinstance(batch, torch.Tensor) else batch[..., ::-1]
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                self.batch_size = max(1, min(self.batch_size, len(batch)) // 2)
+                batch_predictions = self.detect_faces_batch(list(batch))
+            yield batch_predictions
+    
+    def get_smoothened_boxes(self, boxes: Union[List[Tuple[int, int, int, int]], np.ndarray], T: int = 5) -> List[Tuple[int, int, int, int]]:
         """
         Smooth face detection boxes qua temporal window
         
         Args:
-            boxes: List các bounding boxes
+            boxes: List các bounding boxes (có thể chứa None), hoặc array (N, 4)
             T: Window size cho smoothing
             
         Returns:
             Smoothed bounding boxes
         """
-        if len(boxes) <= T:
-            return boxes
-            
-        smoothed = []
-        for i in range(len(boxes)):
-            if i + T > len(boxes):
-                window = boxes[len(boxes) - T:]
-            else:
-                window = boxes[i:i + T]
-            
-            # Convert None boxes to previous valid box for smoothing
-            valid_boxes = [box for box in window if box is not None]
-            if valid_boxes:
-                mean_box = np.mean(valid_boxes, axis=0).astype(int)
-                smoothed.append(tuple(mean_box))
-            else:
-                smoothed.append(boxes[i])  # Keep original if no valid boxes
-                
-        return smoothed
+        if isinstance(boxes, np.ndarray):
+            if len(boxes) <= T:
+                return [tuple(box) for box in boxes.tolist()]
+            valid = np.ones(len(boxes), dtype=bool)
+            arr = boxes.astype(np.int64)
+        else:
+            if len(boxes) <= T:
+                return boxes
+            valid = np.array([box is not None for box in boxes])
+            arr = np.zeros((len(boxes), 4), dtype=np.int64)
+            if valid.any():
+                arr[valid] = np.asarray([box for box in boxes if box is not None], dtype=np.int64)
+        
+        # 🔥 OPTIMIZATION: Sliding-window mean via cumulative sums (no per-frame loop)
+        n = len(boxes)
+        
+        box_csum = np.concatenate([np.zeros((1, 4), dtype=np.int64), np.cumsum(arr, axis=0)])
+        count_csum = np.concatenate([[0], np.cumsum(valid)])
+        
+        # Window for frame i is boxes[i:i+T], clamped to the last T boxes at the end
+        starts = np.minimum(np.arange(n), n - T)
+        window_sum = box_csum[starts + T] - box_csum[starts]
+        window_count = count_csum[starts + T] - count_csum[starts]
+        
+        has_valid = window_count > 0
+        mean_boxes = np.zeros((n, 4), dtype=np.int64)
+        mean_boxes[has_valid] = (window_sum[has_valid] / window_count[has_valid, None]).astype(int)
+        
+        # Keep original box (None) where the window has no valid detection
+        return [tuple(mean_box) if ok else box
+                for mean_box, ok, box in zip(mean_boxes.tolist(), has_valid.tolist(), boxes)]
     
     def process_video_frames(self, 
                            frames: List[np.ndarray],
                            pads: Tuple[int, int, int, int] = (0, 10, 0, 0),
                            smooth: bool = True,
-                           box: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[np.ndarray, Tuple[int, int, int, int]]]:
+                           box: Optional[Tuple[int, int, int, int]] = None,
+                           predictions: Optional[List[Optional[Tuple[int, int, int, int]]]] = None,
+                           face_size: Optional[int] = None) -> List[Tuple[np.ndarray, Tuple[int, int, int, int]]]:
         """
         Process video frames để extract faces với bounding boxes
         
@@ -193,6 +532,8 @@ class FaceDetectionService:
             pads: Padding (top, bottom, left, right)
             smooth: Có smooth detection boxes không
             box: Fixed bounding box nếu có
+            predictions: Detection boxes đã có sẵn (ví dụ từ detect_faces_stream)
+            face_size: Nếu có, faces được crop và resize luôn về (face_size, face_size)
             
         Returns:
             List của (cropped_face, coordinates) cho mỗi frame
@@ -208,51 +549,192 @@ class FaceDetectionService:
             return results
         
         # Face detection
-        logger.info(f"Detecting faces in {len(frames)} frames...")
-        predictions = self.detect_faces_batch(frames)
+        if predictions is None:
+            if len(frames) > self.LOG_MIN_FRAMES:
+                logger.info(f"Detecting faces in {len(frames)} frames...")
+            predictions = self.detect_faces_batch(frames)
         
         # Validate detections
-        for i, rect in enumerate(predictions):
-            if rect is None:
-                # Save faulty frame for debugging
-                faulty_path = Path('temp/faulty_frame.jpg')
-                faulty_path.parent.mkdir(exist_ok=True)
-                cv2.imwrite(str(faulty_path), frames[i])
-                raise ValueError(f'Face not detected in frame {i}! Ensure the video contains a face in all frames.')
+        bad_idx = next((i for i, rect in enumerate(predictions) if rect is None), -1)
+        if bad_idx >= 0:
+            # Save faulty frame for debugging
+            _save_faulty(frames[bad_idx], bad_idx)
+            raise ValueError(f'Face not detected in frame {bad_idx}! Ensure the video contains a face in all frames.')
         
         # Apply padding and extract coordinates
         pady1, pady2, padx1, padx2 = pads
-        coordinates = []
+        rects = np.asarray(predictions, dtype=np.int64)  # (N, 4) as (x1, y1, x2, y2)
+        heights = np.array([frame.shape[0] for frame in frames])
+        widths = np.array([frame.shape[1] for frame in frames])
         
-        for rect, frame in zip(predictions, frames):
-            x1, y1, x2, y2 = rect
-            
-            # Apply padding
-            y1 = max(0, y1 - pady1)
-            y2 = min(frame.shape[0], y2 + pady2)
-            x1 = max(0, x1 - padx1)
-            x2 = min(frame.shape[1], x2 + padx2)
-            
-            coordinates.append((x1, y1, x2, y2))
+        # Apply padding, clipped to each frame
+        rects[:, 0] = np.maximum(rects[:, 0] - padx1, 0)
+        rects[:, 1] = np.maximum(rects[:, 1] - pady1, 0)
+        rects[:, 2] = np.minimum(rects[:, 2] + padx2, widths)
+        rects[:, 3] = np.minimum(rects[:, 3] + pady2, heights)
         
         # Smooth detection boxes
         if smooth:
-            coordinates = self.get_smoothened_boxes(coordinates, T=5)
+            coordinates = self.get_smoothened_boxes(rects, T=5)
+        else:
+            coordinates = [tuple(rect) for rect in rects.tolist()]
         
         # Extract faces
-        results = []
-        for frame, (x1, y1, x2, y2) in zip(frames, coordinates):
-            face = frame[y1:y2, x1:x2]
-            results.append((face, (x1, y1, x2, y2)))
+        if face_size is not None:
+            faces = self.crop_and_resize_faces(frames, coordinates, face_size)
+            results = list(zip(faces, coordinates))
+        else:
+            results = []
+            for frame, (x1, y1, x2, y2) in zip(frames, coordinates):
+                face = frame[y1:y2, x1:x2]
+                results.append((face, (x1, y1, x2, y2)))
         
-        logger.info(f"Successfully processed {len(results)} frames")
+        if len(results) > self.LOG_MIN_FRAMES:
+            logger.info(f"Successfully processed {len(results)} frames")
         return results
     
+    def process_video_frames_stream(self,
+                                    batches: Iterable[np.ndarray],
+                                    pads: Tuple[int, int, int, int] = (0, 10, 0, 0),
+                                    smooth: bool = True,
+                                    face_size: Optional[int] = None,
+                                    T: int = 5) -> Iterator[Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]]:
+        """
+        Streaming version của process_video_frames: yield (frame, face, coords) khi detect xong
+        
+        Smoothing giống hệt get_smoothened_boxes; frame i chỉ được yield khi đã có
+        boxes[i:i+T], nên output trễ T frames so với detector.
+        
+        Args:
+            batches: Iterable các frame batches [B, H, W, 3] (BGR)
+            pads: Padding (top, bottom, left, right)
+            smooth: Có smooth detection boxes không
+            face_size: Nếu có, faces được crop và resize luôn về (face_size, face_size)
+            T: Window size cho smoothing
+            
+        Yields:
+            (frame, cropped_face, coordinates) theo thứ tự frames
+        """
+        frames = []
+        
+        def record(batches):
+            for batch in batches:
+                frames.extend(batch)
+                yield batch
+        
+        pady1, pady2, padx1, padx2 = pads
+        rects = np.empty((0, 4), dtype=np.int64)
+        csum = np.zeros((1, 4), dtype=np.int64)
+        emitted = 0
+        
+        def emit(stop, coordinates):
+            window = frames[:stop - emitted]
+            if face_size is not None:
+                faces = self.crop_and_resize_faces(window, coordinates, face_size)
+            else:
+                faces = [frame[y1:y2, x1:x2] for frame, (x1, y1, x2, y2) in zip(window, coordinates)]
+            del frames[:stop - emitted]
+            return zip(window, faces, coordinates)
+        
+        for batch_predictions in self._iter_stream_detections(record(batches)):
+            n = len(rects)
+            bad_idx = next((i for i, rect in enumerate(batch_predictions) if rect is None), -1)
+            if bad_idx >= 0:
+                _save_faulty(frames[n - emitted + bad_idx], n + bad_idx)
+                raise ValueError(f'Face not detected in frame {n + bad_idx}! Ensure the video contains a face in all frames.')
+            
+            # Apply padding, clipped to each frame
+            batch_rects = np.asarray(batch_predictions, dtype=np.int64).reshape(-1, 4)
+            batch_frames = frames[n - emitted:n - emitted + len(batch_rects)]
+            heights = np.array([frame.shape[0] for frame in batch_frames])
+            widths = np.array([frame.shape[1] for frame in batch_frames])
+            batch_rects[:, 0] = np.maximum(batch_rects[:, 0] - padx1, 0)
+            batch_rects[:, 1] = np.maximum(batch_rects[:, 1] - pady1, 0)
+            batch_rects[:, 2] = np.minimum(batch_rects[:, 2] + padx2, widths)
+            batch_rects[:, 3] = np.minimum(batch_rects[:, 3] + pady2, heights)
+            rects = np.concatenate([rects, batch_rects])
+            csum = np.concatenate([csum, csum[-1] + np.cumsum(batch_rects, axis=0)])
+            
+            # Frame i has its full window once boxes[i:i+T] exist (and the clip is known to exceed T)
+            stop = len(rects) - T if smooth else len(rects)
+            if stop <= emitted:
+                continue
+            if smooth:
+                starts = np.arange(emitted, stop)
+                coordinates = ((csum[starts + T] - csum[starts]) / T).astype(int)
+            else:
+                coordinates = rects[emitted:stop]
+            yield from emit(stop, [tuple(rect) for rect in coordinates.tolist()])
+            emitted = stop
+        
+        n = len(rects)
+        if emitted < n:
+            if smooth and n > T:
+                starts = np.minimum(np.arange(emitted, n), n - T)
+                coordinates = ((csum[starts + T] - csum[starts]) / T).astype(int)
+            else:
+                coordinates = rects[emitted:]
+            yield from emit(n, [tuple(rect) for rect in coordinates.tolist()])
+        
+        if n > self.LOG_MIN_FRAMES:
+            logger.info(f"Successfully processed {n} frames")
+    
+    @torch.inference_mode()
+    def crop_and_resize_faces(self,
+                              frames: List[np.ndarray],
+                              coordinates: List[Tuple[int, int, int, int]],
+                              size: int,
+                              chunk_size: int = 64) -> np.ndarray:
+        """
+        Crop và resize faces về (size, size) bằng torchvision roi_align (một kernel mỗi chunk)
+        
+        sampling_ratio=1 + aligned=True lấy đúng một bilinear sample tại cùng tọa độ
+        như cv2.resize (INTER_LINEAR), nên khớp với CPU fallback; chỉ khác ở viền box,
+        nơi roi_align đọc pixels ngoài box thay vì replicate border của crop.
+        Fallback về cv2.resize từng frame khi không có CUDA hoặc torchvision.
+        
+        Args:
+            frames: List các video frames (BGR)
+            coordinates: Face boxes (x1, y1, x2, y2) cho mỗi frame
+            size: Output face size
+            chunk_size: Số frames upload lên GPU mỗi lần (giới hạn VRAM)
+            
+        Returns:
+            Array [N, size, size, 3] uint8
+        """
+        device = self.detector.device if self.detector is not None else self.device
+        if roi_align is None or 'cuda' not in device or not torch.cuda.is_available():
+            return np.stack([cv2.resize(frame[y1:y2, x1:x2], (size, size))
+                             for frame, (x1, y1, x2, y2) in zip(frames, coordinates)])
+        
+        boxes = torch.tensor(coordinates, dtype=torch.float32, device=device)
+        faces = []
+        for start in range(0, len(frames), chunk_size):
+            chunk = np.stack(frames[start:start + chunk_size])
+            imgs = torch.from_numpy(chunk).to(device).permute(0, 3, 1, 2).float()
+            
+            # roi_align boxes: [K, 5] = (batch_index, x1, y1, x2, y2)
+            chunk_boxes = boxes[start:start + len(chunk)]
+            batch_index = torch.arange(len(chunk), dtype=torch.float32, device=device).unsqueeze(1)
+            crops = roi_align(imgs, torch.cat([batch_index, chunk_boxes], dim=1),
+                              output_size=(size, size), sampling_ratio=1, aligned=True)
+            
+            faces.append(crops.round_().clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).cpu())
+        
+        return torch.cat(faces).numpy()
+    
+    def reset_state(self):
+        """Reset per-clip state giữa các requests, giữ detector và buffers warm"""
+        self._clean_batches = 0
+    
     def cleanup(self):
-        """Cleanup detector để giải phóng memory"""
+        """Cleanup detector để giải phóng memory (chỉ khi shutdown)"""
         if self.detector is not None:
             del self.detector
             self.detector = None
-            if torch.cuda.is_available():
+            self._host_bufs = [None, None]
+            self._host_buf_events = [None, None]
+            # Caching allocator is faster left alone; opt in to releasing memory to the driver
+            if torch.cuda.is_available() and os.environ.get('ILLUMINUS_EMPTY_CACHE'):
                 torch.cuda.empty_cache()
             logger.info("Face detector cleaned up") 
\ No newline at end of file
@@ -3,20 +3,81 @@ Video Processing Service
 Xử lý video input/output và preprocessing
 """
 
+import os
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional
+import torch
+import torch.nn.functional as F
+from fractions import Fraction
+from typing import Dict, Iterator, List, Tuple, Optional, Union
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import shutil
 import subprocess
-import platform
+import tempfile
+import threading
 from loguru import logger
 
+try:
+    import av
+except ImportError:
+    av = None
+
+
+# Default libavcodec options for cv2 FFmpeg captures (multi-threaded decode).
+# Override via env, e.g. 'threads;4|hwaccel;cuda|hwaccel_output_format;cuda' (NVIDIA)
+# or 'threads;4|hwaccel;videotoolbox' (Apple silicon).
+_FFMPEG_CAPTURE_OPTIONS = 'threads;4'
+
+
+def _open_capture(video_path: str) -> cv2.VideoCapture:
+    """Open VideoCapture với FFmpeg backend, fallback về default backend selection"""
+    os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', _FFMPEG_CAPTURE_OPTIONS)
+    try:
+        video_stream = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+        if video_stream.isOpened():
+            return video_stream
+        video_stream.release()
+    except cv2.error as e:
+        logger.warning(f"FFmpeg capture backend unavailable: {e}")
+    return cv2.VideoCapture(video_path)
+
+
+# cv2.VideoWriter_fourcc results, keyed by codec string
+_FOURCC_CACHE: Dict[str, int] = {}
+
+
+def _fourcc(code: str) -> int:
+    """Memoized cv2.VideoWriter_fourcc"""
+    fourcc_code = _FOURCC_CACHE.get(code)
+    if fourcc_code is None:
+        fourcc_code = cv2.VideoWriter_fourcc(*code)
+        _FOURCC_CACHE[code] = fourcc_code
+    return fourcc_code
+
 
 class VideoProcessingService:
     """Service xử lý video processing"""
     
-    def __init__(self):
-        """Initialize Video Processing Service"""
+    # Cached result của NVENC probe (None = chưa probe)
+    _nvenc_available: Optional[bool] = None
+    
+    # PyAV wheels thường build không có NVENC: nhớ kết quả lần encode đầu tiên
+    _pyav_nvenc_available: Optional[bool] = None
+    
+    # Parallel CPU decode: số shards và độ dài tối thiểu để đáng chia
+    DECODE_SHARDS = 4
+    PARALLEL_DECODE_MIN_FRAMES = 500
+    
+    def __init__(self, device: str = 'cuda'):
+        """
+        Initialize Video Processing Service
+        
+        Args:
+            device: Device cho GPU frame ops (resize); 'cpu' giữ mọi thứ trên CPU
+        """
+        self.device = device
         logger.info("VideoProcessingService initialized")
     
     def load_video_frames(self, 
@@ -47,7 +108,7 @@ class VideoProcessingService:
             return [frame], 25.0  # Default FPS for static image
         
         # Load video
-        video_stream = cv2.VideoCapture(video_path)
+        video_stream = _open_capture(video_path)
         fps = video_stream.get(cv2.CAP_PROP_FPS)
         
         if fps <= 0:
@@ -56,39 +117,279 @@ class VideoProcessingService:
         
         logger.info(f'Reading video frames from: {video_path} (FPS: {fps})')
         
-        frames = []
-        while True:
-            still_reading, frame = video_stream.read()
+        frame_count = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+        height = int(video_stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(video_stream.get(cv2.CAP_PROP_FRAME_WIDTH))
+        
+        # 🔥 OPTIMIZATION: Decode long videos as parallel shards (OpenCV releases the GIL)
+        frames = None
+        shards = min(self.DECODE_SHARDS, (os.cpu_count() or 1) // 2)
+        if frame_count > self.PARALLEL_DECODE_MIN_FRAMES and shards > 1:
+            frames = self._read_frames_sharded(video_path, frame_count, height, width, shards)
+        
+        if frames is None:
+            frames = self._read_frames_into_buffer(video_stream, frame_count, height, width)
+        
+        video_stream.release()
+        logger.info(f"Loaded {len(frames)} frames from video")
+        
+        if len(frames) == 0:
+            raise ValueError(f'No frames could be loaded from video: {video_path}')
+        
+        # 🔥 OPTIMIZATION: Resize all frames in one batched op instead of per-frame cv2 calls
+        if resize_factor > 1:
+            frames = self._resize_frames(frames, resize_factor)
+        
+        if rotate:
+            return [self._transform_frame(frame, 1, crop, rotate) for frame in frames], fps
+        
+        # Crop as a zero-copy view over the whole buffer
+        y1, y2, x1, x2 = crop
+        if x2 == -1:
+            x2 = frames.shape[2]
+        if y2 == -1:
+            y2 = frames.shape[1]
+        
+        return list(frames[:, y1:y2, x1:x2]), fps
+    
+    def _read_frames_into_buffer(self,
+                                 video_stream: cv2.VideoCapture,
+                                 frame_count: int,
+                                 height: int,
+                                 width: int) -> np.ndarray:
+        """
+        Decode frames thẳng vào một pre-allocated buffer thay vì allocate mỗi frame
+        
+        Args:
+            video_stream: Opened VideoCapture
+            frame_count: Số frames ước lượng (CAP_PROP_FRAME_COUNT)
+            height: Frame height
+            width: Frame width
+            
+        Returns:
+            Array [N, H, W, 3] uint8 chứa N frames đã decode
+        """
+        buf = np.empty((max(frame_count, 1), height, width, 3), dtype=np.uint8)
+        count = 0
+        
+        while video_stream.grab():
+            if count == len(buf):
+                # CAP_PROP_FRAME_COUNT is only an estimate for some containers
+                grown = np.empty((len(buf) * 2,) + buf.shape[1:], dtype=np.uint8)
+                grown[:count] = buf[:count]
+                buf = grown
+            
+            target = buf[count]
+            still_reading, frame = video_stream.retrieve(target)
             if not still_reading:
                 break
             
-            # Apply resize
-            if resize_factor > 1:
-                new_width = frame.shape[1] // resize_factor
-                new_height = frame.shape[0] // resize_factor
-                frame = cv2.resize(frame, (new_width, new_height))
+            if frame.shape != target.shape:
+                if count > 0:
+                    raise ValueError(f'Inconsistent frame size in video: {frame.shape} vs {target.shape}')
+                # Container metadata disagrees with decoded size (e.g. rotation): re-allocate
+                buf = np.empty((len(buf),) + frame.shape, dtype=np.uint8)
+                target = buf[0]
             
-            # Apply rotation
-            if rotate:
-                frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+            if not np.may_share_memory(frame, target):
+                np.copyto(target, frame)
+            count += 1
+        
+        return buf[:count]
+    
+    def _read_frames_sharded(self,
+                             video_path: str,
+                             frame_count: int,
+                             height: int,
+                             width: int,
+                             shards: int) -> Optional[np.ndarray]:
+        """
+        Decode video bằng nhiều VideoCapture song song, mỗi shard seek tới đoạn của nó
+        
+        Args:
+            video_path: Path đến video file
+            frame_count: Số frames (CAP_PROP_FRAME_COUNT)
+            height: Frame height
+            width: Frame width
+            shards: Số decode threads
             
-            # Apply crop
-            y1, y2, x1, x2 = crop
-            if x2 == -1:
-                x2 = frame.shape[1]
-            if y2 == -1:
-                y2 = frame.shape[0]
+        Returns:
+            Array [N, H, W, 3] uint8, hoặc None nếu shards không khớp hoặc seek sai vị trí
+            (dùng sequential decode)
+        """
+        buf = np.empty((frame_count, height, width, 3), dtype=np.uint8)
+        bounds = np.linspace(0, frame_count, shards + 1, dtype=int)
+        
+        def decode_shard(start: int, end: int) -> int:
+            video_stream = _open_capture(video_path)
+            try:
+                if start > 0:
+                    video_stream.set(cv2.CAP_PROP_POS_FRAMES, start)
+                    # FFmpeg seeks are keyframe-based: a shard that lands elsewhere would decode the wrong frames
+                    if int(round(video_stream.get(cv2.CAP_PROP_POS_FRAMES))) != start:
+                        return -1
+                for i in range(start, end):
+                    if not video_stream.grab():
+                        return i - start
+                    target = buf[i]
+                    still_reading, frame = video_stream.retrieve(target)
+                    if not still_reading or frame.shape != target.shape:
+                        return i - start
+                    if not np.may_share_memory(frame, target):
+                        np.copyto(target, frame)
+                if int(round(video_stream.get(cv2.CAP_PROP_POS_FRAMES))) != end:
+                    return -1
+                if end == frame_count and video_stream.grab():
+                    return -1  # Frame count under-estimated: frames beyond the buffer
+                return end - start
+            finally:
+                video_stream.release()
+        
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            decoded = list(executor.map(decode_shard, bounds[:-1], bounds[1:]))
+        
+        # Only the last shard may come up short (frame count over-estimated); -1 = seek mismatch
+        if any(count < 0 for count in decoded) or any(count != end - start
+                                  for count, start, end in zip(decoded[:-1], bounds[:-2], bounds[1:-1])):
+            logger.warning("Sharded decode mismatch, falling back to sequential decode")
+            return None
+        
+        return buf[:bounds[-2] + decoded[-1]]
+    
+    def _resize_frames(self, frames: np.ndarray, resize_factor: int, chunk_size: int = 64) -> np.ndarray:
+        """
+        Downscale frames bằng resize_factor
+        
+        CUDA (service device): F.interpolate (mode='area') trên từng chunk frames đã stack.
+        CPU: cv2.resize qua cv2.UMat (OpenCL T-API) khi OpenCL đã được bật trong process.
+        
+        Args:
+            frames: Decoded frames [N, H, W, 3]
+            resize_factor: Downscale factor
+            chunk_size: Số frames mỗi lần upload lên GPU
             
-            frame = frame[y1:y2, x1:x2]
-            frames.append(frame)
+        Returns:
+            Resized frames [N, H // resize_factor, W // resize_factor, 3]
+        """
+        new_height = frames.shape[1] // resize_factor
+        new_width = frames.shape[2] // resize_factor
         
-        video_stream.release()
-        logger.info(f"Loaded {len(frames)} frames from video")
+        if 'cuda' in str(self.device) and torch.cuda.is_available():
+            resized = np.empty((len(frames), new_height, new_width, 3), dtype=np.uint8)
+            for start in range(0, len(frames), chunk_size):
+                chunk = torch.from_numpy(frames[start:start + chunk_size]).to(self.device)
+                out = F.interpolate(chunk.permute(0, 3, 1, 2).float(), size=(new_height, new_width), mode='area')
+                resized[start:start + chunk_size] = out.round_().clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).cpu().numpy()
+            return resized
         
-        if len(frames) == 0:
-            raise ValueError(f'No frames could be loaded from video: {video_path}')
+        # Respect the process-wide OpenCL setting instead of switching it on for every cv2 call
+        if cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL():
+            return np.stack([cv2.resize(cv2.UMat(frame), (new_width, new_height)).get() for frame in frames])
+        
+        return np.stack([cv2.resize(frame, (new_width, new_height)) for frame in frames])
+    
+    def _transform_frame(self,
+                         frame: np.ndarray,
+                         resize_factor: int,
+                         crop: Tuple[int, int, int, int],
+                         rotate: bool) -> np.ndarray:
+        """Apply resize, rotation và crop cho một decoded frame"""
+        # Apply resize
+        if resize_factor > 1:
+            new_width = frame.shape[1] // resize_factor
+            new_height = frame.shape[0] // resize_factor
+            frame = cv2.resize(frame, (new_width, new_height))
+        
+        # Apply rotation
+        if rotate:
+            frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
         
-        return frames, fps
+        # Apply crop
+        y1, y2, x1, x2 = crop
+        if x2 == -1:
+            x2 = frame.shape[1]
+        if y2 == -1:
+            y2 = frame.shape[0]
+        
+        return frame[y1:y2, x1:x2]
+    
+    def stream_frames(self,
+                      video_path: str,
+                      batch_size: int,
+                      resize_factor: int = 1,
+                      crop: Tuple[int, int, int, int] = (0, -1, 0, -1),
+                      rotate: bool = False,
+                      max_frames: Optional[int] = None,
+                      queue_size: int = 4) -> Iterator[np.ndarray]:
+        """
+        Decode video trong background thread, yield frame batches [B, H, W, 3]
+        
+        Decode (CPU) chạy song song với consumer (face detection trên GPU) qua
+        bounded queue, nên decoder không chạy quá consumer quá queue_size batches.
+        
+        Args:
+            video_path: Path đến video file
+            batch_size: Số frames mỗi batch
+            resize_factor: Factor để resize video
+            crop: Crop coordinates (top, bottom, left, right)
+            rotate: Có rotate video 90 độ không
+            max_frames: Dừng decode sau số frames này (None = toàn bộ video)
+            queue_size: Số batches tối đa chờ trong queue
+            
+        Yields:
+            Batches of BGR frames
+        """
+        if not Path(video_path).exists():
+            raise ValueError(f'Video file not found: {video_path}')
+        
+        batches: queue.Queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        end_of_stream = object()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def decode():
+            video_stream = _open_capture(video_path)
+            try:
+                batch = []
+                decoded = 0
+                while not stop.is_set() and (max_frames is None or decoded < max_frames):
+                    still_reading, frame = video_stream.read()
+                    if not still_reading:
+                        break
+                    batch.append(self._transform_frame(frame, resize_factor, crop, rotate))
+                    decoded += 1
+                    if len(batch) == batch_size:
+                        put(np.stack(batch))
+                        batch = []
+                if batch:
+                    put(np.stack(batch))
+            except Exception as e:
+                put(e)
+            finally:
+                video_stream.release()
+                put(end_of_stream)
+        
+        decoder = threading.Thread(target=decode, name='video-decode', daemon=True)
+        decoder.start()
+        
+        try:
+            while True:
+                item = batches.get()
+                if item is end_of_stream:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            decoder.join()
     
     def save_video_frames(self, 
                          frames: List[np.ndarray],
@@ -117,7 +418,7 @@ class VideoProcessingService:
         frame_h, frame_w = frames[0].shape[:2]
         
         # Create video writer
-        fourcc_code = cv2.VideoWriter_fourcc(*fourcc)
+        fourcc_code = _fourcc(fourcc)
         out = cv2.VideoWriter(output_path, fourcc_code, fps, (frame_w, frame_h))
         
         if not out.isOpened():
@@ -132,11 +433,114 @@ class VideoProcessingService:
         
         return output_path
     
+    def save_video_frames_gpu(self,
+                              frames: torch.Tensor,
+                              output_path: str,
+                              fps: float = 25.0,
+                              codec: str = 'h264_nvenc') -> str:
+        """
+        Encode frames tensor bằng NVENC qua PyAV
+        
+        Frames được copy device->host một lần cho cả clip. Fallback về
+        save_video_frames (cv2.VideoWriter) khi PyAV hoặc encoder không khả dụng.
+        
+        Args:
+            frames: Tensor [N, H, W, 3] BGR uint8 (CPU hoặc GPU)
+            output_path: Path để save video
+            fps: Frame rate
+            codec: FFmpeg encoder name
+            
+        Returns:
+            Path của video đã save
+        """
+        if frames.shape[0] == 0:
+            raise ValueError("No frames to save")
+        
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        host_frames = frames.cpu().numpy()
+        
+        if av is not None:
+            try:
+                self._encode_with_pyav(host_frames, output_path, fps, codec)
+                logger.info(f"Video saved to: {output_path} ({len(host_frames)} frames, {fps} FPS, {codec})")
+                return output_path
+            except Exception as e:
+                logger.warning(f"PyAV {codec} encoding failed, falling back to cv2.VideoWriter: {e}")
+        
+        return self.save_video_frames(list(host_frames), output_path, fps)
+    
+    def save_video_frames_nvenc(self,
+                                frames: List[np.ndarray],
+                                output_path: str,
+                                fps: float = 25.0) -> bool:
+        """
+        Encode host frames thành H.264 bằng NVENC qua PyAV
+        
+        Args:
+            frames: List các BGR frames để save
+            output_path: Path để save video
+            fps: Frame rate
+            
+        Returns:
+            True nếu đã encode, False khi PyAV/NVENC không khả dụng (caller tự fallback)
+        """
+        if (not frames or av is None or VideoProcessingService._pyav_nvenc_available is False
+                or not self.has_nvenc()):
+            return False
+        
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._encode_with_pyav(frames, output_path, fps, 'h264_nvenc')
+        except Exception as e:
+            logger.warning(f"PyAV h264_nvenc encoding unavailable, using cv2.VideoWriter: {e}")
+            VideoProcessingService._pyav_nvenc_available = False
+            return False
+        
+        VideoProcessingService._pyav_nvenc_available = True
+        logger.info(f"Video saved to: {output_path} ({len(frames)} frames, {fps} FPS, h264_nvenc)")
+        return True
+    
+    def _encode_with_pyav(self, frames: Union[np.ndarray, List[np.ndarray]], output_path: str, fps: float, codec: str):
+        """Encode BGR frames [N, H, W, 3] (array hoặc list) thành video file bằng PyAV"""
+        frame_h, frame_w = frames[0].shape[:2]
+        
+        with av.open(output_path, mode='w') as container:
+            stream = container.add_stream(codec, rate=Fraction(fps).limit_denominator(1001))
+            stream.width = frame_w
+            stream.height = frame_h
+            stream.pix_fmt = 'yuv420p'
+            
+            for frame in frames:
+                video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+                for packet in stream.encode(video_frame):
+                    container.mux(packet)
+            
+            # Flush encoder
+            for packet in stream.encode():
+                container.mux(packet)
+    
+    @classmethod
+    def has_nvenc(cls) -> bool:
+        """Check FFmpeg có h264_nvenc encoder và có CUDA device (probe một lần)"""
+        if cls._nvenc_available is None:
+            available = False
+            if shutil.which('ffmpeg') and torch.cuda.is_available():
+                try:
+                    encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                              check=True, capture_output=True, text=True).stdout
+                    available = 'h264_nvenc' in encoders
+                except (subprocess.CalledProcessError, OSError):
+                    available = False
+            cls._nvenc_available = available
+            logger.info(f"FFmpeg NVENC available: {available}")
+        return cls._nvenc_available
+    
     def merge_video_audio(self, 
                          video_path: str,
                          audio_path: str,
                          output_path: str,
-                         video_quality: int = 1) -> str:
+                         video_quality: int = 1,
+                         copy_video: bool = False) -> str:
         """
         Merge video với audio using FFmpeg
         
@@ -145,6 +549,7 @@ class VideoProcessingService:
             audio_path: Path đến audio file
             output_path: Path để save final video
             video_quality: Video quality (1 = highest)
+            copy_video: Video đã encode H.264 (NVENC): mux stream không re-encode
             
         Returns:
             Path của final video
@@ -161,13 +566,30 @@ class VideoProcessingService:
             '-q:v', str(video_quality),  # Video quality
             output_path
         ]
+        if copy_video:
+            command = ['ffmpeg', '-y', '-i', audio_path, '-i', video_path,
+                       '-strict', '-2', '-c:v', 'copy', output_path]
         
         try:
-            # Run FFmpeg command
-            if platform.system() == 'Windows':
-                subprocess.run(command, check=True, capture_output=True)
-            else:
-                subprocess.run(' '.join(command), shell=True, check=True, capture_output=True)
+            # 🔥 OPTIMIZATION: Decode + encode on GPU (NVDEC/NVENC) when available
+            if not copy_video and self.has_nvenc():
+                nvenc_command = [
+                    'ffmpeg', '-y',
+                    '-i', audio_path,
+                    '-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda',
+                    '-i', video_path,
+                    '-strict', '-2',
+                    '-c:v', 'h264_nvenc', '-cq', '19',
+                    output_path
+                ]
+                try:
+                    subprocess.run(nvenc_command, check=True, capture_output=True)
+                    logger.info(f"Successfully merged video and audio (NVENC): {output_path}")
+                    return output_path
+                except subprocess.CalledProcessError as e:
+                    logger.warning(f"NVENC merge failed, falling back to CPU encode: {e}")
+            
+            subprocess.run(command, check=True, capture_output=True)
             
             logger.info(f"Successfully merged video and audio: {output_path}")
             return output_path
@@ -179,6 +601,77 @@ class VideoProcessingService:
             logger.error("FFmpeg not found. Please install FFmpeg.")
             raise RuntimeError("FFmpeg not found. Please install FFmpeg and add it to PATH.")
     
+    def write_video_with_audio(self,
+                               frames: List[np.ndarray],
+                               audio_path: str,
+                               output_path: str,
+                               fps: float = 25.0,
+                               crf: int = 18) -> str:
+        """
+        Encode frames và mux audio trong một FFmpeg process
+        
+        Raw BGR frames được ghi thẳng vào FFmpeg stdin, thay cho save_video_frames +
+        merge_video_audio (không có temp video). Dùng NVENC khi có, fallback CPU encoder.
+        
+        Args:
+            frames: List các BGR frames (cùng kích thước)
+            audio_path: Path đến audio file
+            output_path: Path để save final video
+            fps: Frame rate
+            crf: libx264 CRF cho CPU encoder (thấp hơn = chất lượng cao hơn)
+            
+        Returns:
+            Path của final video
+            
+        Raises:
+            RuntimeError: Khi FFmpeg không encode được
+        """
+        if not frames:
+            raise ValueError("No frames to save")
+        
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        frame_h, frame_w = frames[0].shape[:2]
+        
+        base_command = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{frame_w}x{frame_h}', '-r', str(fps),
+            '-i', '-',         # Video frames from stdin
+            '-i', audio_path,  # Audio input
+            '-strict', '-2'    # Allow experimental codecs
+        ]
+        # yuv420p: rawvideo bgr24 input would otherwise make libx264 pick yuv444p (not browser-playable)
+        encoder_args = [['-c:v', 'libx264', '-crf', str(crf), '-pix_fmt', 'yuv420p']]
+        if self.has_nvenc():
+            encoder_args.insert(0, ['-c:v', 'h264_nvenc', '-cq', '19', '-pix_fmt', 'yuv420p'])
+        
+        error = None
+        for video_args in encoder_args:
+            try:
+                self._pipe_frames(base_command + video_args + [output_path], frames)
+                logger.info(f"Video saved to: {output_path} ({len(frames)} frames, {fps} FPS, with audio)")
+                return output_path
+            except (subprocess.CalledProcessError, OSError) as e:
+                error = e
+                logger.warning(f"FFmpeg pipe encode failed ({' '.join(video_args)}): {e}")
+        
+        raise RuntimeError(f"Failed to write video with audio: {error}")
+    
+    @staticmethod
+    def _pipe_frames(command: List[str], frames: List[np.ndarray]):
+        """Chạy FFmpeg command và ghi raw frames vào stdin"""
+        # stderr goes to a temp file: a full stderr pipe would block FFmpeg while we block on stdin
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=stderr_file)
+            try:
+                for frame in frames:
+                    process.stdin.write(np.ascontiguousarray(frame).data)
+            except BrokenPipeError:
+                pass  # FFmpeg exited early; return code and stderr below report why
+            process.communicate()
+            if process.returncode != 0:
+                stderr_file.seek(0)
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr_file.read())
+    
     def extract_audio(self, video_path: str, output_audio_path: str) -> str:
         """
         Extract audio từ video file
@@ -206,10 +699,7 @@ class VideoProcessingService:
         
         try:
             # Run FFmpeg command
-            if platform.system() == 'Windows':
-                subprocess.run(command, check=True, capture_output=True)
-            else:
-                subprocess.run(' '.join(command), shell=True, check=True, capture_output=True)
+            subprocess.run(command, check=True, capture_output=True)
             
             logger.info(f"Audio extracted to: {output_audio_path}")
             return output_audio_path
@@ -247,7 +737,7 @@ class VideoProcessingService:
         if not Path(video_path).exists():
             raise ValueError(f'Video file not found: {video_path}')
         
-        cap = cv2.VideoCapture(video_path)
+        cap = _open_capture(video_path)
         
         if not cap.isOpened():
             raise ValueError(f'Cannot open video file: {video_path}')
@@ -3,15 +3,28 @@ Wav2Lip Pipeline Service
 Tích hợp face detection và Wav2Lip processing thành pipeline hoàn chỉnh
 """
 
+import os
+import hashlib
 import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 import time
 import sys
-from typing import List, Tuple, Optional, Dict, Any
+import queue
+import threading
+import itertools
+from typing import Iterable, Iterator, List, Tuple, Optional, Dict, Any
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from loguru import logger
 
+try:
+    import torch_tensorrt
+except ImportError:
+    torch_tensorrt = None
+
 # Add root path to import config
 root_path = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(root_path))
@@ -24,6 +37,7 @@ try:
     from src.models.nota_wav2lip.demo import Wav2LipModelComparisonDemo
     from src.models.nota_wav2lip.video import AudioSlicer
     from src.config import hparams as hp
+    from src.utils.quantization import quantize_wav2lip_int8
 except ImportError as e:
     logger.error(f"Import error: {e}")
     raise e
@@ -32,6 +46,13 @@ except ImportError as e:
 class Wav2LipPipelineService:
     """Pipeline service tích hợp hoàn chỉnh cho Wav2Lip với face detection"""
     
+    # Persistent face caches (faces_<key>.npz) giữ lại trong result_dir, cũ nhất bị xóa trước
+    FACE_CACHE_MAX_FILES = 8
+    
+    # INT8 calibration: số mel/face pairs và batch size khi calibrate
+    INT8_CALIBRATION_SAMPLES = 100
+    INT8_CALIBRATION_BATCH = 16
+    
     def __init__(self, 
                  device: str = 'cuda',
                  face_det_batch_size: int = 16,
@@ -65,10 +86,19 @@ class Wav2LipPipelineService:
             )
             logger.info("Created internal face detection service")
             
-        self.video_processing_service = VideoProcessingService()
+        self.video_processing_service = VideoProcessingService(device=device)
         
         # Wave2Lip servicer (lazy load)
         self.wave2lip_servicer = None
+        self._compiled_models = set()  # model_type đã compile (torch.compile/TensorRT, batch shape cố định)
+        self.use_bf16 = False  # Set khi Wave2Lip chạy trên GPU hỗ trợ BF16 (Ampere+)
+        self.use_channels_last = False  # Set khi Wave2Lip chạy trên CUDA (NHWC cuDNN convs)
+        
+        # Double-buffered host staging cho model inputs (pinned trên CUDA), pinned output cho D2H
+        self._host_bufs: List[Optional[Tuple[torch.Tensor, torch.Tensor]]] = [None, None]
+        self._host_buf_events: List[Optional[torch.cuda.Event]] = [None, None]
+        self._out_buf: Optional[torch.Tensor] = None
+        self._copy_stream = None
         
         logger.info(f"Wav2LipPipelineService initialized with device: {device}")
     
@@ -80,9 +110,202 @@ class Wav2LipPipelineService:
                 device=self.device,
                 result_dir=str(self.result_dir)
             )
+            
+            # Opt-in TensorRT engines (FP16, FP32 I/O, contiguous inputs)
+            use_tensorrt = (bool(os.environ.get('ILLUMINUS_TENSORRT')) and torch_tensorrt is not None
+                            and str(self.device).startswith('cuda'))
+            
+            # 🔥 OPTIMIZATION: BF16 weights/activations on Ampere+ (half the memory traffic, tensor cores)
+            self.use_bf16 = (str(self.device).startswith('cuda') and torch.cuda.is_bf16_supported()
+                             and not use_tensorrt)
+            if self.use_bf16:
+                for impl in self.wave2lip_servicer.model_zoo.values():
+                    impl.model = impl.model.to(dtype=torch.bfloat16)
+            
+            # 🔥 OPTIMIZATION: channels_last weights; faces arrive as NHWC so no transpose is materialized
+            self.use_channels_last = str(self.device).startswith('cuda') and not use_tensorrt
+            if self.use_channels_last:
+                for impl in self.wave2lip_servicer.model_zoo.values():
+                    impl.model = impl.model.to(memory_format=torch.channels_last)
+            
+            if use_tensorrt:
+                self._build_tensorrt_models()
+            self._compile_models()
+            
+            # Opt-in INT8 (CPU quantized kernels), calibrated from save_int8_calibration output
+            calibration_path = os.environ.get('ILLUMINUS_INT8_CALIBRATION')
+            use_int8 = bool(calibration_path) and not str(self.device).startswith('cuda')
+            if use_int8:
+                self._quantize_models_int8(Path(calibration_path))
+            logger.info(f"Wave2Lip precision: {'int8' if use_int8 else 'bf16' if self.use_bf16 else 'fp32'}")
             logger.info("Wave2Lip servicer initialized")
         return self.wave2lip_servicer
     
+    def _sample_inputs(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Zero (mel, face) inputs ở canonical shape: _process_batch pads mọi batch lên wav2lip_batch_size"""
+        img_size = hp.face.img_size
+        dtype = self._model_dtype()
+        img_tensor = torch.zeros((self.wav2lip_batch_size, 6, img_size, img_size), device=self.device, dtype=dtype)
+        img_tensor = img_tensor.contiguous(memory_format=self._memory_format())
+        mel_tensor = torch.zeros((self.wav2lip_batch_size, 1, hp.audio.num_mels, hp.face.mel_step_size),
+                                 device=self.device, dtype=dtype)
+        return mel_tensor, img_tensor
+    
+    def _build_tensorrt_models(self):
+        """Build TensorRT engines (FP16) cho các Wave2Lip models ở canonical batch shape"""
+        mel_tensor, img_tensor = self._sample_inputs()
+        
+        for model_type, impl in self.wave2lip_servicer.model_zoo.items():
+            eager_model = impl.model.eval()
+            try:
+                # Trace first: Wav2LipBase.forward is not scriptable (try/except)
+                with torch.inference_mode():
+                    traced = torch.jit.trace(eager_model, (mel_tensor, img_tensor))
+                impl.model = torch_tensorrt.compile(
+                    traced,
+                    inputs=[torch_tensorrt.Input(tuple(mel_tensor.shape)), torch_tensorrt.Input(tuple(img_tensor.shape))],
+                    enabled_precisions={torch.float, torch.half}
+                )
+                with torch.inference_mode():
+                    impl.model(mel_tensor, img_tensor)
+                self._compiled_models.add(model_type)
+                logger.info(f"✅ Built TensorRT engine for {model_type} (batch={self.wav2lip_batch_size})")
+            except Exception as e:
+                logger.warning(f"⚠️ TensorRT build failed for {model_type}, falling back: {e}")
+                impl.model = eager_model
+    
+    def _compile_models(self):
+        """torch.compile các Wave2Lip models (PyTorch 2.x + CUDA) và warmup với batch shape cố định"""
+        if not hasattr(torch, 'compile') or not str(self.device).startswith('cuda'):
+            return
+        
+        mel_tensor, img_tensor = self._sample_inputs()
+        
+        for model_type, impl in self.wave2lip_servicer.model_zoo.items():
+            if model_type in self._compiled_models:
+                continue
+            eager_model = impl.model.eval()
+            try:
+                # 🔥 OPTIMIZATION: Fused kernels + CUDA Graphs, autotuned once at warmup
+                impl.model = torch.compile(eager_model, mode='max-autotune')
+                with torch.inference_mode(), self._autocast():
+                    impl.model(mel_tensor, img_tensor)
+                self._compiled_models.add(model_type)
+                logger.info(f"✅ Compiled {model_type} (batch={self.wav2lip_batch_size})")
+            except Exception as e:
+                logger.warning(f"⚠️ torch.compile failed for {model_type}, using eager model: {e}")
+                impl.model = eager_model
+    
+    @staticmethod
+    def _int8_checkpoint_path(model_type: str) -> Path:
+        """TorchScript INT8 model lưu cạnh FP32 checkpoint"""
+        return Path(hp.inference.model[model_type].checkpoint).with_suffix('.int8.pt')
+    
+    def _quantize_models_int8(self, calibration_path: Path):
+        """
+        Thay các Wave2Lip models bằng INT8 version (load từ cache hoặc PTQ từ calibration set)
+        
+        Args:
+            calibration_path: .npz từ save_int8_calibration (faces uint8 [N, H, W, 3], mels [N, 1, mels, steps])
+        """
+        calibration = None
+        
+        for model_type, impl in self.wave2lip_servicer.model_zoo.items():
+            int8_path = self._int8_checkpoint_path(model_type)
+            fp32_path = Path(hp.inference.model[model_type].checkpoint)
+            try:
+                if int8_path.exists() and (not fp32_path.exists()
+                                           or int8_path.stat().st_mtime_ns >= fp32_path.stat().st_mtime_ns):
+                    impl.model = torch.jit.load(str(int8_path), map_location='cpu')
+                    logger.info(f"✅ Loaded INT8 {model_type} from {int8_path}")
+                    continue
+                
+                if calibration is None:
+                    calibration = self._load_int8_calibration(calibration_path)
+                quantized = quantize_wav2lip_int8(impl.model, calibration)
+                with torch.no_grad():
+                    traced = torch.jit.trace(quantized, calibration[0])
+                tmp_path = int8_path.with_suffix('.tmp')
+                torch.jit.save(traced, str(tmp_path))
+                os.replace(tmp_path, int8_path)
+                impl.model = traced
+                logger.info(f"✅ Quantized {model_type} to INT8, saved to {int8_path}")
+            except Exception as e:
+                logger.warning(f"⚠️ INT8 quantization failed for {model_type}, using FP32 model: {e}")
+    
+    def _load_int8_calibration(self, calibration_path: Path) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+        """Calibration (mel, face_input) batches, preprocess giống _process_batch"""
+        with np.load(calibration_path) as data:
+            faces, mels = data['faces'], data['mels'].astype(np.float32)
+        
+        batches = []
+        for start in range(0, len(faces), self.INT8_CALIBRATION_BATCH):
+            face_input = self._build_face_input(torch.from_numpy(faces[start:start + self.INT8_CALIBRATION_BATCH]))
+            batches.append((torch.from_numpy(mels[start:start + self.INT8_CALIBRATION_BATCH]), face_input))
+        return batches
+    
+    def save_int8_calibration(self,
+                              video_path: str,
+                              audio_path: str,
+                              output_path: str,
+                              num_samples: Optional[int] = None) -> str:
+        """
+        Build INT8 calibration set (mel/face pairs) từ một held-out video + audio
+        
+        Dùng output với ILLUMINUS_INT8_CALIBRATION=<output_path>.
+        
+        Args:
+            video_path: Path đến video (talking face)
+            audio_path: Path đến audio
+            output_path: Path .npz output
+            num_samples: Số pairs, lấy đều theo thời gian (mặc định INT8_CALIBRATION_SAMPLES)
+            
+        Returns:
+            Path của calibration file
+        """
+        num_samples = num_samples or self.INT8_CALIBRATION_SAMPLES
+        frames, _ = self.video_processing_service.load_video_frames(video_path)
+        mel_chunks = self._load_mel_chunks(audio_path)
+        
+        length = min(len(frames), len(mel_chunks))
+        if length == 0:
+            raise ValueError(f'No frames/audio chunks for calibration: {video_path}, {audio_path}')
+        indices = np.unique(np.linspace(0, length - 1, min(num_samples, length)).astype(int))
+        
+        # Subsampled frames are not temporally adjacent: no box smoothing
+        face_results = self.face_detection_service.process_video_frames(
+            frames=[frames[i] for i in indices],
+            smooth=False,
+            face_size=hp.face.img_size
+        )
+        faces = np.stack([face for face, _ in face_results])
+        mels = np.stack([mel_chunks[i] for i in indices])[:, None].astype(np.float32)
+        
+        output_path = str(Path(output_path).with_suffix('.npz'))
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(output_path, faces=faces, mels=mels)
+        logger.info(f"Saved {len(faces)} INT8 calibration pairs to {output_path}")
+        return output_path
+    
+    def _model_dtype(self) -> torch.dtype:
+        """Dtype của Wave2Lip weights/inputs"""
+        return torch.bfloat16 if self.use_bf16 else torch.float32
+    
+    def _memory_format(self) -> torch.memory_format:
+        """Memory format của Wave2Lip face inputs"""
+        return torch.channels_last if self.use_channels_last else torch.contiguous_format
+    
+    def _autocast(self):
+        """BF16 autocast context cho Wave2Lip forward (no-op khi FP32)"""
+        return torch.autocast('cuda', dtype=torch.bfloat16, enabled=self.use_bf16)
+    
+    def warmup(self):
+        """Load face detector và Wave2Lip models trước request đầu tiên"""
+        logger.info("Warming up pipeline models...")
+        self.face_detection_service._initialize_detector()
+        self._get_wave2lip_servicer()
+        logger.info("Pipeline models ready")
+    
     def process_video_audio(self,
                            video_path: str,
                            audio_path: str,
@@ -97,7 +320,10 @@ class Wav2LipPipelineService:
                            nosmooth: bool = False,
                            # Processing options
                            static: bool = False,
-                           output_path: Optional[str] = None) -> Dict[str, Any]:
+                           output_path: Optional[str] = None,
+                           # Cached intermediate results (skip recomputation)
+                           precomputed_faces: Optional[List[Tuple[np.ndarray, Tuple[int, int, int, int]]]] = None,
+                           precomputed_mel_chunks: Optional[List[np.ndarray]] = None) -> Dict[str, Any]:
         """
         Process video và audio để tạo lip-sync video
         
@@ -113,80 +339,129 @@ class Wav2LipPipelineService:
             nosmooth: Tắt smoothing
             static: Sử dụng static image
             output_path: Path output tùy chọn
+            precomputed_faces: Face detection results từ lần chạy trước với cùng input
+            precomputed_mel_chunks: Mel chunks từ lần chạy trước với cùng audio
             
         Returns:
-            Dictionary chứa thông tin kết quả
+            Dictionary chứa thông tin kết quả (kèm 'face_results' và 'mel_chunks' để cache)
         """
         start_time = time.time()
+        audio_executor = None
         
         try:
-            # Load video frames
-            logger.info("Loading video frames...")
-            frames, fps = self.video_processing_service.load_video_frames(
-                video_path=video_path,
-                resize_factor=resize_factor,
-                crop=crop,
-                rotate=rotate
-            )
-            
-            # Check if static mode
-            if static and len(frames) > 1:
-                frames = [frames[0]]
-                logger.info("Using static mode - only first frame")
-            
-            # Process audio
-            logger.info("Processing audio...")
-            audio_slicer = AudioSlicer(audio_path)
-            mel_chunks = list(audio_slicer)
+            is_image = Path(video_path).suffix.lower() in ['.jpg', '.png', '.jpeg']
             
-            logger.info(f"Video frames: {len(frames)}, Audio chunks: {len(mel_chunks)}")
+            # 🔥 OPTIMIZATION: Persistent face detection cache for videos (same file + detection options)
+            face_cache_path = None
+            if precomputed_faces is None and not static and not is_image:
+                face_cache_path = self._face_cache_path(
+                    video_path, resize_factor=resize_factor, crop=crop, rotate=rotate,
+                    pads=pads, box=box, nosmooth=nosmooth
+                )
+                precomputed_faces = self._load_cached_faces(face_cache_path)
             
-            # Adjust frames to match audio length
-            if not static:
-                min_length = min(len(frames), len(mel_chunks))
-                frames = frames[:min_length]
-                mel_chunks = mel_chunks[:min_length]
-                logger.info(f"Adjusted to {min_length} frames/chunks")
+            # 🔥 OPTIMIZATION: Run face detection and lip-sync inference concurrently for real videos
+            stream_detect = (not static and not is_image and precomputed_faces is None
+                             and (box is None or box == (-1, -1, -1, -1)))
             
-            # Face detection and processing
-            logger.info("Processing faces...")
-            face_results = self.face_detection_service.process_video_frames(
-                frames=frames,
-                pads=pads,
-                smooth=not nosmooth,
-                box=box if box != (-1, -1, -1, -1) else None
-            )
+            # Process audio: first for streamed decode (it bounds how many frames are needed),
+            # otherwise in the background while frames load
+            mel_future = None
+            if precomputed_mel_chunks is not None:
+                logger.info("Using cached mel spectrogram chunks")
+                mel_chunks = precomputed_mel_chunks
+            elif stream_detect:
+                logger.info("Processing audio...")
+                mel_chunks = self._load_mel_chunks(audio_path)
+            else:
+                logger.info("Processing audio in background...")
+                audio_executor = ThreadPoolExecutor(max_workers=1)
+                mel_future = audio_executor.submit(self._load_mel_chunks, audio_path)
             
-            # Generate lip-sync video
-            logger.info(f"Generating lip-sync video with {model_type}...")
-            output_frames = self._generate_lip_sync_frames(
-                face_results=face_results,
-                mel_chunks=mel_chunks,
-                original_frames=frames,
-                model_type=model_type,
-                static=static
-            )
-            
-            # Save video
-            temp_video_path = self.result_dir / 'temp_result.mp4'
-            self.video_processing_service.save_video_frames(
-                frames=output_frames,
-                output_path=str(temp_video_path),
-                fps=fps
-            )
+            if stream_detect:
+                logger.info(f"Generating lip-sync video with {model_type} and streamed face detection...")
+                output_frames, fps, face_results = self._generate_with_streamed_detection(
+                    video_path=video_path,
+                    mel_chunks=mel_chunks,
+                    model_type=model_type,
+                    resize_factor=resize_factor,
+                    crop=crop,
+                    rotate=rotate,
+                    pads=pads,
+                    smooth=not nosmooth
+                )
+                all_mel_chunks = mel_chunks
+                if face_cache_path is not None:
+                    self._save_cached_faces(face_cache_path, face_results)
+            else:
+                logger.info("Loading video frames...")
+                frames, fps = self.video_processing_service.load_video_frames(
+                    video_path=video_path,
+                    resize_factor=resize_factor,
+                    crop=crop,
+                    rotate=rotate
+                )
+                
+                if mel_future is not None:
+                    mel_chunks = mel_future.result()
+                all_mel_chunks = mel_chunks
+                
+                # Check if static mode
+                if static and len(frames) > 1:
+                    frames = [frames[0]]
+                    logger.info("Using static mode - only first frame")
+                
+                logger.info(f"Video frames: {len(frames)}, Audio chunks: {len(mel_chunks)}")
+                
+                # Adjust frames to match audio length (mel chunks are consumed lazily up to num_chunks)
+                num_chunks = len(mel_chunks)
+                if not static:
+                    min_length = min(len(frames), len(mel_chunks))
+                    frames = frames[:min_length]
+                    num_chunks = min_length
+                    logger.info(f"Adjusted to {min_length} frames/chunks")
+                
+                # Face detection and processing (cache may hold more frames, e.g. from longer audio)
+                if precomputed_faces is not None and len(precomputed_faces) >= len(frames):
+                    logger.info("Using cached face detection results")
+                    face_results = precomputed_faces[:len(frames)]
+                else:
+                    logger.info("Processing faces...")
+                    face_results = self.face_detection_service.process_video_frames(
+                        frames=frames,
+                        pads=pads,
+                        smooth=not nosmooth,
+                        box=box if box != (-1, -1, -1, -1) else None,
+                        face_size=hp.face.img_size
+                    )
+                    if face_cache_path is not None:
+                        self._save_cached_faces(face_cache_path, face_results)
+                
+                # Generate lip-sync video
+                logger.info(f"Generating lip-sync video with {model_type}...")
+                output_frames = self._generate_lip_sync_frames(
+                    sources=((frame, face, coords) for frame, (face, coords) in zip(frames, face_results)),
+                    mel_iter=iter(mel_chunks),
+                    num_frames=num_chunks,
+                    model_type=model_type,
+                    static=static
+                )
             
-            # Merge with audio
+            # Save video with audio
             if output_path is None:
                 output_path = self.result_dir / 'result_with_audio.mp4'
             
-            final_output = self.video_processing_service.merge_video_audio(
-                video_path=str(temp_video_path),
-                audio_path=audio_path,
-                output_path=str(output_path)
-            )
-            
-            # Cleanup temp file
-            temp_video_path.unlink(missing_ok=True)
+            # 🔥 OPTIMIZATION: Pipe raw frames into one FFmpeg encode + mux (no temp video on disk)
+            try:
+                final_output = self.video_processing_service.write_video_with_audio(
+                    frames=output_frames,
+                    audio_path=audio_path,
+                    output_path=str(output_path),
+                    fps=fps
+                )
+            except RuntimeError as e:
+                logger.warning(f"Piped FFmpeg encode failed, using temp video + merge: {e}")
+                final_output = self._save_with_temp_video(output_frames, audio_path, str(output_path), fps)
             
             # Calculate metrics
             processing_time = time.time() - start_time
@@ -202,30 +477,243 @@ class Wav2LipPipelineService:
             }
             
             logger.info(f"Pipeline completed successfully: {result}")
+            result['face_results'] = face_results
+            result['mel_chunks'] = all_mel_chunks
             return result
             
         except Exception as e:
             logger.error(f"Pipeline processing failed: {e}")
             raise e
         finally:
-            # Cleanup
-            self.cleanup()
+            if audio_executor is not None:
+                audio_executor.shutdown(wait=False)
+            # Keep models warm for the next request; full cleanup() runs on shutdown
+            self.reset_state()
+    
+    def _face_cache_path(self, video_path: str, **options) -> Path:
+        """Path của persistent face cache, keyed theo video file (path, mtime, size) và detection options"""
+        stat = os.stat(video_path)
+        key_data = repr((str(Path(video_path).resolve()), stat.st_mtime_ns, stat.st_size, sorted(options.items())))
+        key = hashlib.blake2b(key_data.encode(), digest_size=8).hexdigest()
+        return self.result_dir / f"faces_{key}.npz"
+    
+    @staticmethod
+    def _load_cached_faces(cache_path: Path) -> Optional[List[Tuple[np.ndarray, Tuple[int, int, int, int]]]]:
+        """Load face results từ persistent cache, None nếu chưa có"""
+        if not cache_path.exists():
+            return None
+        try:
+            with np.load(cache_path) as data:
+                faces, coords = data['faces'], data['coords']
+            os.utime(cache_path)  # Recently used: evicted last
+            logger.info(f"Loaded {len(coords)} cached face detections from {cache_path}")
+            return [(faces[i], tuple(int(v) for v in coords[i])) for i in range(len(coords))]
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load face cache {cache_path}: {e}")
+            return None
+    
+    @staticmethod
+    def _save_cached_faces(cache_path: Path, face_results: List[Tuple[np.ndarray, Tuple[int, int, int, int]]]):
+        """Save face results (faces resized về model input size + coords) vào persistent cache"""
+        img_size = hp.face.img_size
+        tmp_path = cache_path.with_suffix('.tmp.npz')
+        try:
+            faces = np.stack([
+                face if face.shape[:2] == (img_size, img_size) else cv2.resize(face, (img_size, img_size))
+                for face, _ in face_results
+            ])
+            coords = np.asarray([coords for _, coords in face_results], dtype=np.int32)
+            np.savez(tmp_path, faces=faces, coords=coords)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save face cache {cache_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        
+        # Evict least recently used caches beyond FACE_CACHE_MAX_FILES
+        try:
+            caches = sorted(cache_path.parent.glob('faces_*.npz'), key=lambda path: path.stat().st_mtime)
+            for stale in caches[:-Wav2LipPipelineService.FACE_CACHE_MAX_FILES]:
+                stale.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not evict old face caches: {e}")
+    
+    def _save_with_temp_video(self,
+                              output_frames: List[np.ndarray],
+                              audio_path: str,
+                              output_path: str,
+                              fps: float) -> str:
+        """Save frames thành temp video rồi merge với audio (fallback khi không pipe được vào FFmpeg)"""
+        # 🔥 OPTIMIZATION: Encode H.264 once on NVENC so the audio merge only remuxes the video
+        temp_video_path = self.result_dir / 'temp_result.mp4'
+        video_is_h264 = self.video_processing_service.save_video_frames_nvenc(
+            frames=output_frames,
+            output_path=str(temp_video_path),
+            fps=fps
+        )
+        if not video_is_h264:
+            self.video_processing_service.save_video_frames(
+                frames=output_frames,
+                output_path=str(temp_video_path),
+                fps=fps
+            )
+        
+        try:
+            return self.video_processing_service.merge_video_audio(
+                video_path=str(temp_video_path),
+                audio_path=audio_path,
+                output_path=output_path,
+                copy_video=video_is_h264
+            )
+        finally:
+            temp_video_path.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _load_mel_chunks(audio_path: str) -> List[np.ndarray]:
+        """Mel spectrogram chunks của audio (views vào một mel spectrogram)"""
+        return AudioSlicer(audio_path).mel_chunks
+    
+    def _generate_with_streamed_detection(self,
+                                          video_path: str,
+                                          mel_chunks: List[np.ndarray],
+                                          model_type: str,
+                                          resize_factor: int,
+                                          crop: Tuple[int, int, int, int],
+                                          rotate: bool,
+                                          pads: Tuple[int, int, int, int],
+                                          smooth: bool) -> Tuple[List[np.ndarray], float, List[Tuple[np.ndarray, Tuple[int, int, int, int]]]]:
+        """
+        Chạy face detection (producer thread) song song với Wav2Lip inference (consumer)
+        
+        Mỗi bên chạy trên CUDA stream riêng; faces đi qua bounded queue nên Wav2Lip
+        bắt đầu ngay khi batch faces đầu tiên sẵn sàng thay vì chờ detect hết video.
+        
+        Args:
+            video_path: Path đến video file
+            mel_chunks: Mel spectrogram chunks (giới hạn số frames cần decode)
+            model_type: Model type để sử dụng
+            resize_factor: Factor để resize video
+            crop: Crop coordinates
+            rotate: Có rotate video không
+            pads: Padding cho face detection
+            smooth: Có smooth detection boxes không
+            
+        Returns:
+            Tuple of (output frames, fps, face results để cache)
+        """
+        fps = self.video_processing_service.get_video_info(video_path)['fps']
+        if fps <= 0:
+            fps = 25.0  # Default FPS
+            logger.warning(f"Invalid FPS detected, using default: {fps}")
+        
+        batches = self.video_processing_service.stream_frames(
+            video_path=video_path,
+            batch_size=self.face_detection_service.batch_size,
+            resize_factor=resize_factor,
+            crop=crop,
+            rotate=rotate,
+            max_frames=len(mel_chunks)
+        )
+        
+        face_results = []
+        
+        def sources():
+            for frame, face, coords in self._stream_face_results(batches, pads, smooth):
+                face_results.append((face, coords))
+                yield frame, face, coords
+        
+        use_cuda = str(self.device).startswith('cuda') and torch.cuda.is_available()
+        with torch.cuda.stream(torch.cuda.Stream()) if use_cuda else nullcontext():
+            output_frames = self._generate_lip_sync_frames(
+                sources=sources(),
+                mel_iter=iter(mel_chunks),
+                num_frames=len(mel_chunks),
+                model_type=model_type
+            )
+        
+        if len(output_frames) == 0:
+            raise ValueError(f'No frames could be loaded from video: {video_path}')
+        
+        logger.info(f"Video frames: {len(output_frames)}, Audio chunks: {len(mel_chunks)}")
+        return output_frames, fps, face_results
+    
+    def _stream_face_results(self,
+                             batches: Iterable[np.ndarray],
+                             pads: Tuple[int, int, int, int],
+                             smooth: bool,
+                             queue_size: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]]:
+        """
+        Detect faces trong background thread (CUDA stream riêng), yield (frame, face, coords)
+        
+        Args:
+            batches: Frame batches từ VideoProcessingService.stream_frames
+            pads: Padding cho face detection
+            smooth: Có smooth detection boxes không
+            queue_size: Số frames tối đa chờ trong queue (mặc định 2 Wav2Lip batches)
+            
+        Yields:
+            (frame, face resized về model input size, coordinates) theo thứ tự frames
+        """
+        items: queue.Queue = queue.Queue(maxsize=queue_size or 2 * self.wav2lip_batch_size)
+        stop = threading.Event()
+        end_of_stream = object()
+        use_cuda = str(self.device).startswith('cuda') and torch.cuda.is_available()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def detect():
+            try:
+                with torch.cuda.stream(torch.cuda.Stream()) if use_cuda else nullcontext():
+                    for item in self.face_detection_service.process_video_frames_stream(
+                        batches, pads=pads, smooth=smooth, face_size=hp.face.img_size
+                    ):
+                        if stop.is_set():
+                            break
+                        put(item)
+            except Exception as e:
+                put(e)
+            finally:
+                put(end_of_stream)
+        
+        detector = threading.Thread(target=detect, name='face-detection', daemon=True)
+        detector.start()
+        
+        try:
+            while True:
+                item = items.get()
+                if item is end_of_stream:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            detector.join()
     
     def _generate_lip_sync_frames(self,
-                                 face_results: List[Tuple[np.ndarray, Tuple[int, int, int, int]]],
-                                 mel_chunks: List[np.ndarray],
-                                 original_frames: List[np.ndarray],
+                                 sources: Iterable[Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]],
+                                 mel_iter: Iterable[np.ndarray],
+                                 num_frames: int,
                                  model_type: str,
                                  static: bool = False) -> List[np.ndarray]:
         """
         Generate lip-sync frames sử dụng Wave2Lip model
         
+        H2D copy của batch i+1 chạy trên copy stream trong khi batch i đang inference.
+        Sources được đọc lazily, nên có thể là output của face detection đang chạy.
+        
         Args:
-            face_results: List of (face, coordinates) from face detection
-            mel_chunks: List of mel spectrograms
-            original_frames: List of original frames
+            sources: Iterable of (original frame, face, coordinates)
+            mel_iter: Mel spectrogram chunks, đọc lần lượt theo từng batch
+            num_frames: Số output frames tối đa (dừng sớm nếu sources hoặc mel_iter hết)
             model_type: Model type để sử dụng
-            static: Static mode
+            static: Static mode (một source frame cho mọi mel chunk)
             
         Returns:
             List of output frames
@@ -233,54 +721,179 @@ class Wav2LipPipelineService:
         # Get Wave2Lip servicer
         servicer = self._get_wave2lip_servicer()
         
-        # Prepare data generator
         output_frames = []
+        pending = None
+        batches = self._iter_lip_sync_batches(sources, mel_iter, num_frames, static)
+        for index, (img_batch, mel_batch, frame_batch, coords_batch) in enumerate(batches):
+            inputs = self._upload_batch(index % 2, img_batch, mel_batch, model_type)
+            
+            if pending is not None:
+                output_frames.extend(self._process_batch(*pending, servicer, model_type))
+            pending = (inputs, frame_batch, coords_batch)
+        
+        if pending is not None:
+            output_frames.extend(self._process_batch(*pending, servicer, model_type))
+        
+        return output_frames
+    
+    def _iter_lip_sync_batches(self,
+                               sources: Iterable[Tuple[np.ndarray, np.ndarray, Tuple[int, int, int, int]]],
+                               mel_iter: Iterable[np.ndarray],
+                               num_frames: int,
+                               static: bool) -> Iterator[Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray], List[Tuple[int, int, int, int]]]]:
+        """Group (face, mel, frame, coords) theo wav2lip_batch_size"""
+        img_size = hp.face.img_size
+        sources = iter(sources)
+        
+        if static:
+            # One source frame for every mel chunk: paste into copies
+            first = next(sources, None)
+            if first is None:
+                return
+            frame, face, coords = first
+            if face.shape[:2] != (img_size, img_size):
+                face = cv2.resize(face, (img_size, img_size))
+            sources = itertools.repeat((frame, face, coords))
+        
         img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+        copy_frames = static
         
-        for i, mel in enumerate(mel_chunks):
-            # Get frame index
-            idx = 0 if static else i % len(face_results)
-            face, coords = face_results[idx]
-            original_frame = original_frames[idx].copy()
+        for i, (frame, face, coords), mel in zip(range(num_frames), sources, mel_iter):
+            if i == 0 and not static:
+                # 🔥 OPTIMIZATION: Paste in place unless face crops alias the frames
+                copy_frames = np.may_share_memory(face, frame)
             
-            # Resize face to model input size
-            face_resized = cv2.resize(face, (hp.face.img_size, hp.face.img_size))
+            # Already model-sized when cropped via roi_align
+            if face.shape[:2] != (img_size, img_size):
+                face = cv2.resize(face, (img_size, img_size))
             
-            img_batch.append(face_resized)
+            img_batch.append(face)
             mel_batch.append(mel)
-            frame_batch.append(original_frame)
+            frame_batch.append(frame.copy() if copy_frames else frame)
             coords_batch.append(coords)
             
-            # Process batch when full
             if len(img_batch) >= self.wav2lip_batch_size:
-                batch_frames = self._process_batch(
-                    img_batch, mel_batch, frame_batch, coords_batch, servicer, model_type
-                )
-                output_frames.extend(batch_frames)
+                yield img_batch, mel_batch, frame_batch, coords_batch
                 img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
         
-        # Process remaining batch
         if len(img_batch) > 0:
-            batch_frames = self._process_batch(
-                img_batch, mel_batch, frame_batch, coords_batch, servicer, model_type
-            )
-            output_frames.extend(batch_frames)
-        
-        return output_frames
+            yield img_batch, mel_batch, frame_batch, coords_batch
     
-    def _process_batch(self,
+    def _upload_batch(self,
+                      slot: int,
                       img_batch: List[np.ndarray],
                       mel_batch: List[np.ndarray],
+                      model_type: str) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.cuda.Event], int]:
+        """
+        Build model inputs và bắt đầu copy host->device
+        
+        Inputs được ghi thẳng vào staging buffer của slot (pinned trên CUDA) và copy
+        async trên copy stream; compute stream chờ event trước khi forward.
+        
+        Returns:
+            Tuple of (uint8 faces tensor, mel_tensor, copy event hoặc None, số frames thật)
+        """
+        # Compiled models: pad partial batch lên canonical shape để tránh recompilation
+        num_frames = len(img_batch)
+        count = num_frames
+        if model_type in self._compiled_models:
+            count = max(num_frames, self.wav2lip_batch_size)
+        
+        use_cuda = str(self.device).startswith('cuda') and torch.cuda.is_available()
+        img_host, mel_host = self._stage_host_inputs(slot, img_batch, mel_batch, count, pin=use_cuda)
+        dtype = self._model_dtype()
+        
+        if not use_cuda:
+            return img_host.to(self.device), mel_host.to(self.device, dtype=dtype), None, num_frames
+        
+        # 🔥 OPTIMIZATION: Pinned staging + side-stream copy overlaps the previous batch's forward
+        if self._copy_stream is None:
+            self._copy_stream = torch.cuda.Stream()
+        with torch.cuda.stream(self._copy_stream):
+            faces = img_host.to(self.device, non_blocking=True)
+            mel_tensor = mel_host.to(self.device, dtype=dtype, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(self._copy_stream)
+        # Slot is refilled only after this copy has completed
+        self._host_buf_events[slot] = ready
+        return faces, mel_tensor, ready, num_frames
+    
+    def _stage_host_inputs(self,
+                           slot: int,
+                           img_batch: List[np.ndarray],
+                           mel_batch: List[np.ndarray],
+                           count: int,
+                           pin: bool) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Ghi raw faces (uint8) và mels (FP32) vào host buffers của slot (reuse giữa các batches)
+        
+        Rows từ len(img_batch) đến count là zero padding.
+        
+        Returns:
+            Tensor views [count, H, W, 3] và [count, 1, mels, steps]
+        """
+        img_size = hp.face.img_size
+        img_shape = (img_size, img_size, 3)
+        mel_shape = (1,) + tuple(mel_batch[0].shape)
+        
+        bufs = self._host_bufs[slot]
+        if (bufs is None or tuple(bufs[0].shape[1:]) != img_shape or tuple(bufs[1].shape[1:]) != mel_shape
+                or bufs[0].shape[0] < count or bufs[0].is_pinned() != pin):
+            capacity = max(count, self.wav2lip_batch_size)
+            img_buf = torch.empty((capacity,) + img_shape, dtype=torch.uint8)
+            mel_buf = torch.empty((capacity,) + mel_shape, dtype=torch.float32)
+            if pin:
+                img_buf, mel_buf = img_buf.pin_memory(), mel_buf.pin_memory()
+            bufs = (img_buf, mel_buf)
+            self._host_bufs[slot] = bufs
+            self._host_buf_events[slot] = None
+        elif self._host_buf_events[slot] is not None:
+            # Previous H2D copy from this slot must finish before overwriting it
+            self._host_buf_events[slot].synchronize()
+        
+        img_host, mel_host = bufs[0][:count], bufs[1][:count]
+        img_np, mel_np = img_host.numpy(), mel_host.numpy()
+        
+        num_frames = len(img_batch)
+        for j, (face, mel) in enumerate(zip(img_batch, mel_batch)):
+            img_np[j] = face
+            mel_np[j, 0] = mel
+        
+        img_np[num_frames:] = 0
+        mel_np[num_frames:] = 0
+        return img_host, mel_host
+    
+    def _build_face_input(self, faces: torch.Tensor) -> torch.Tensor:
+        """
+        Build Wav2Lip face input trên device từ raw uint8 faces
+        
+        Args:
+            faces: uint8 tensor [B, H, W, 3]
+            
+        Returns:
+            [B, 6, H, W] tensor (masked face | face) trong [0, 1], model dtype/memory format
+        """
+        # NHWC uint8 permuted to NCHW is already channels_last in memory
+        face = faces.permute(0, 3, 1, 2).float().div_(255.)
+        face_input = torch.empty((face.shape[0], 6) + tuple(face.shape[2:]), device=face.device,
+                                 dtype=self._model_dtype(), memory_format=self._memory_format())
+        half = hp.face.img_size // 2
+        face_input[:, 3:] = face
+        face_input[:, :3, :half] = face[:, :, :half]
+        face_input[:, :3, half:] = 0
+        return face_input
+    
+    def _process_batch(self,
+                      inputs: Tuple[torch.Tensor, torch.Tensor, Optional[torch.cuda.Event], int],
                       frame_batch: List[np.ndarray],
                       coords_batch: List[Tuple[int, int, int, int]],
                       servicer,
                       model_type: str) -> List[np.ndarray]:
         """
-        Process một batch của images và mels
+        Process một batch đã upload (từ _upload_batch)
         
         Args:
-            img_batch: Batch of face images
-            mel_batch: Batch of mel spectrograms
+            inputs: (uint8 faces, mel_tensor, copy event, num_frames)
             frame_batch: Batch of original frames
             coords_batch: Batch of coordinates
             servicer: Wave2Lip servicer
@@ -289,47 +902,96 @@ class Wav2LipPipelineService:
         Returns:
             List of processed frames
         """
-        # Convert to numpy arrays
-        img_batch = np.asarray(img_batch)
-        mel_batch = np.asarray(mel_batch)
-        
-        # Prepare input for model
-        img_masked = img_batch.copy()
-        img_masked[:, hp.face.img_size//2:] = 0
+        faces, mel_tensor, ready, num_frames = inputs
+        if ready is not None:
+            compute_stream = torch.cuda.current_stream()
+            compute_stream.wait_event(ready)
+            faces.record_stream(compute_stream)
+            mel_tensor.record_stream(compute_stream)
         
-        img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-        mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
-        
-        # Convert to torch tensors
-        img_tensor = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(self.device)
-        mel_tensor = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(self.device)
+        # 🔥 OPTIMIZATION: Mask + concat + normalize on device (H2D carries 3-channel uint8 only)
+        img_tensor = self._build_face_input(faces)
         
         # Get model
         model = servicer.model_zoo[model_type]
         
         # Inference
-        with torch.no_grad():
+        with torch.inference_mode(), self._autocast():
             pred = model(mel_tensor, img_tensor)
         
-        # Convert back to numpy
-        pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
+        # Drop padded rows and faces whose box falls outside the frame
+        pasted = [
+            i for i, ((x1, y1, x2, y2), frame) in enumerate(zip(coords_batch, frame_batch))
+            if frame.shape[0] > y2 and frame.shape[1] > x2 and y1 >= 0 and x1 >= 0
+        ]
+        pred = pred[:num_frames]
+        if len(pasted) < num_frames:
+            pred = pred[pasted]
+        faces = self._resize_predictions(pred, [coords_batch[i] for i in pasted])
         
-        # Reconstruct frames
-        output_frames = []
-        for p, frame, coords in zip(pred, frame_batch, coords_batch):
-            x1, y1, x2, y2 = coords
-            p_resized = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
-            
-            # Use original frame and paste the generated face
-            output_frame = frame.copy()
-            if (output_frame.shape[0] > y2 and output_frame.shape[1] > x2 and 
-                y1 >= 0 and x1 >= 0):
-                output_frame[y1:y2, x1:x2] = p_resized
-            
-            output_frames.append(output_frame)
+        # Reconstruct frames: frame_batch is already copied where source frames are reused
+        output_frames = list(frame_batch)
+        for i, face in zip(pasted, faces):
+            x1, y1, x2, y2 = coords_batch[i]
+            output_frames[i][y1:y2, x1:x2] = face
         
         return output_frames
     
+    def _resize_predictions(self,
+                            pred: torch.Tensor,
+                            boxes: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """
+        Resize predicted faces về kích thước box trên device, một D2H copy cho cả batch
+        
+        Faces được group theo (h, w) để mỗi box size chỉ cần một F.interpolate
+        (thường chỉ một group khi boxes đã smoothed).
+        
+        Args:
+            pred: Model output [N, 3, H, W] trong [0, 1]
+            boxes: (x1, y1, x2, y2) cho từng face
+            
+        Returns:
+            List of uint8 faces [h, w, 3] (views vào output buffer, valid đến batch kế tiếp)
+        """
+        if len(boxes) == 0:
+            return []
+        
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            buckets.setdefault((y2 - y1, x2 - x1), []).append(i)
+        
+        # 🔥 OPTIMIZATION: Bilinear resize + uint8 conversion on device (replaces per-face cv2.resize)
+        pred = pred.float()
+        chunks = []
+        for (h, w), indices in buckets.items():
+            group = pred if len(indices) == len(pred) else pred[indices]
+            resized = F.interpolate(group, size=(h, w), mode='bilinear', align_corners=False)
+            chunks.append(resized.mul_(255.).clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1).reshape(-1))
+        flat = chunks[0] if len(chunks) == 1 else torch.cat(chunks)
+        
+        if flat.is_cuda:
+            if self._out_buf is None or self._out_buf.numel() < flat.numel():
+                self._out_buf = torch.empty(flat.numel(), dtype=torch.uint8).pin_memory()
+            host = self._out_buf[:flat.numel()]
+            host.copy_(flat, non_blocking=True)
+            torch.cuda.current_stream().synchronize()
+            host = host.numpy()
+        else:
+            host = flat.numpy()
+        
+        faces = [None] * len(boxes)
+        offset = 0
+        for (h, w), indices in buckets.items():
+            size = h * w * 3
+            for i in indices:
+                faces[i] = host[offset:offset + size].reshape(h, w, 3)
+                offset += size
+        return faces
+    
+    def reset_state(self):
+        """Reset per-request state, giữ face detector và Wave2Lip models loaded"""
+        self.face_detection_service.reset_state()
+    
     def cleanup(self):
         """Cleanup services để giải phóng memory"""
         logger.info("Cleaning up pipeline services...")
@@ -343,9 +1005,15 @@ class Wav2LipPipelineService:
             for model in self.wave2lip_servicer.model_zoo.values():
                 del model
             self.wave2lip_servicer = None
+            self._compiled_models.clear()
+        
+        # Release pinned staging buffers
+        self._host_bufs = [None, None]
+        self._host_buf_events = [None, None]
+        self._out_buf = None
         
-        # Clear CUDA cache
-        if torch.cuda.is_available():
+        # Clear CUDA cache (opt-in, see FaceDetectionService.cleanup)
+        if torch.cuda.is_available() and os.environ.get('ILLUMINUS_EMPTY_CACHE'):
             torch.cuda.empty_cache()
         
         logger.info("Pipeline cleanup completed") 
\ No newline at end of file
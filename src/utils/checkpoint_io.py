@@ -0,0 +1,95 @@
+"""
+Checkpoint I/O helpers
+Load/convert model weights, ưu tiên safetensors (mmap, zero-copy) khi có
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import torch
+from loguru import logger
+
+try:
+    from safetensors.torch import load_file as _load_safetensors
+    from safetensors.torch import save_file as _save_safetensors
+except ImportError:
+    _load_safetensors = None
+    _save_safetensors = None
+
+
+def safetensors_path(checkpoint_path: Union[str, Path]) -> Path:
+    """Path của safetensors sidecar tương ứng với một .pth checkpoint"""
+    return Path(checkpoint_path).with_suffix('.safetensors')
+
+
+def _sidecar_is_fresh(sidecar: Path, checkpoint_path: Union[str, Path]) -> bool:
+    """Sidecar chỉ hợp lệ khi không cũ hơn .pth (checkpoint bị thay/re-download thì phải convert lại)"""
+    checkpoint_path = Path(checkpoint_path)
+    if not checkpoint_path.exists():
+        return True
+    return sidecar.stat().st_mtime_ns >= checkpoint_path.stat().st_mtime_ns
+
+
+def load_state_dict(checkpoint_path: Union[str, Path], device: str = 'cpu') -> Dict[str, torch.Tensor]:
+    """
+    Load state_dict, dùng safetensors sidecar nếu đã được convert từ chính .pth này
+
+    Sidecar cũ hơn .pth bị bỏ qua; .pth được load và convert lại.
+
+    Args:
+        checkpoint_path: Path đến .pth checkpoint
+        device: Device để map tensors ('cpu' hoặc 'cuda')
+
+    Returns:
+        State dict
+    """
+    sidecar = safetensors_path(checkpoint_path)
+    stale = False
+    if _load_safetensors is not None and sidecar.exists():
+        if _sidecar_is_fresh(sidecar, checkpoint_path):
+            try:
+                return _load_safetensors(str(sidecar), device=device)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load {sidecar}, falling back to torch.load: {e}")
+        else:
+            logger.info(f"Safetensors sidecar is older than {checkpoint_path}, reconverting")
+            stale = True
+
+    state_dict = torch.load(str(checkpoint_path), map_location=device)
+    if stale:
+        convert_to_safetensors(state_dict, checkpoint_path)
+    return state_dict
+
+
+def convert_to_safetensors(state_dict: Dict[str, torch.Tensor], checkpoint_path: Union[str, Path]) -> Optional[Path]:
+    """
+    Save state_dict thành safetensors sidecar bên cạnh checkpoint
+
+    Args:
+        state_dict: State dict đã load từ checkpoint
+        checkpoint_path: Path đến .pth checkpoint
+
+    Returns:
+        Path của sidecar, hoặc None nếu không convert được
+    """
+    if _save_safetensors is None:
+        return None
+
+    if not isinstance(state_dict, dict) or not all(isinstance(v, torch.Tensor) for v in state_dict.values()):
+        logger.info(f"Skipping safetensors conversion (not a plain state_dict): {checkpoint_path}")
+        return None
+
+    sidecar = safetensors_path(checkpoint_path)
+    tmp_path = sidecar.with_suffix('.safetensors.tmp')
+    try:
+        tensors = {k: v.detach().cpu().contiguous() for k, v in state_dict.items()}
+        _save_safetensors(tensors, str(tmp_path))
+        os.replace(tmp_path, sidecar)
+        logger.info(f"✅ Converted checkpoint to safetensors: {sidecar}")
+        return sidecar
+    except Exception as e:
+        logger.warning(f"⚠️ Safetensors conversion failed for {checkpoint_path}: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return None
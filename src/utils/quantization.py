@@ -0,0 +1,115 @@
+"""
+INT8 quantization helpers
+Post-training static quantization (FX graph mode) cho Wav2Lip generators, chạy trên CPU kernels (fbgemm/qnnpack)
+"""
+
+import copy
+import inspect
+from typing import Dict, Iterable, List, Tuple
+
+import torch
+from torch import nn
+from loguru import logger
+
+try:
+    from torch.ao.quantization import HistogramObserver, PerChannelMinMaxObserver, QConfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+except ImportError:
+    prepare_fx = None
+    convert_fx = None
+
+
+def int8_qconfig() -> 'QConfig':
+    """Per-channel symmetric INT8 weights, histogram-calibrated INT8 activations"""
+    return QConfig(
+        activation=HistogramObserver.with_args(reduce_range=True),
+        weight=PerChannelMinMaxObserver.with_args(dtype=torch.qint8, qscheme=torch.per_channel_symmetric)
+    )
+
+
+def quantized_engine() -> str:
+    """Quantized CPU backend: fbgemm (x86, VNNI) hoặc qnnpack (ARM)"""
+    engines = torch.backends.quantized.supported_engines
+    return 'fbgemm' if 'fbgemm' in engines else 'qnnpack'
+
+
+def _conv_blocks(model: nn.Module) -> List[Tuple[nn.Module, str]]:
+    """
+    (parent, attribute name) của các conv blocks trong Wav2LipBase
+
+    Wav2LipBase.forward có control flow theo input rank nên không FX-traceable;
+    từng block (Conv2d/ConvTranspose2d + BN + ReLU) thì trace được.
+    """
+    blocks = [(model, 'audio_encoder'), (model, 'output_block')]
+    for block_list in (model.face_encoder_blocks, model.face_decoder_blocks):
+        blocks.extend((block_list, str(i)) for i in range(len(block_list)))
+    return blocks
+
+
+def _capture_block_inputs(model: nn.Module,
+                          blocks: List[Tuple[nn.Module, str]],
+                          sample: Tuple[torch.Tensor, torch.Tensor]) -> Dict[int, Tuple[torch.Tensor, ...]]:
+    """Record input của mỗi block trong một forward (example_inputs cho prepare_fx trên PyTorch >= 1.13)"""
+    inputs = {}
+    handles = []
+    for parent, name in blocks:
+        block = getattr(parent, name)
+        handles.append(block.register_forward_pre_hook(
+            lambda module, args: inputs.setdefault(id(module), tuple(args))
+        ))
+    try:
+        with torch.no_grad():
+            model(*sample)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return inputs
+
+
+def quantize_wav2lip_int8(model: nn.Module,
+                          calibration: Iterable[Tuple[torch.Tensor, torch.Tensor]]) -> nn.Module:
+    """
+    Post-training static INT8 quantization cho một Wav2Lip generator
+
+    Mỗi conv block được prepare/convert riêng (quantize ở input, dequantize ở output),
+    skip connections (torch.cat) giữa các blocks vẫn là FP32.
+
+    Args:
+        model: FP32 Wav2Lip model (không bị thay đổi)
+        calibration: (mel, face_input) batches trên CPU, cùng format với _process_batch
+
+    Returns:
+        Quantized copy của model (CPU)
+    """
+    if prepare_fx is None:
+        raise RuntimeError("torch.ao.quantization is not available")
+
+    torch.backends.quantized.engine = quantized_engine()
+    model = copy.deepcopy(model).cpu().float().eval()
+    calibration = list(calibration)
+    if not calibration:
+        raise ValueError("Empty INT8 calibration set")
+
+    blocks = _conv_blocks(model)
+    qconfig_dict = {'': int8_qconfig()}
+
+    # PyTorch >= 1.13 requires example_inputs; 1.12 does not accept it
+    example_inputs = None
+    if 'example_inputs' in inspect.signature(prepare_fx).parameters:
+        example_inputs = _capture_block_inputs(model, blocks, calibration[0])
+
+    for parent, name in blocks:
+        block = getattr(parent, name)
+        kwargs = {} if example_inputs is None else {'example_inputs': example_inputs[id(block)]}
+        setattr(parent, name, prepare_fx(block, qconfig_dict, **kwargs))
+
+    with torch.no_grad():
+        for mel, face in calibration:
+            model(mel, face)
+
+    for parent, name in blocks:
+        setattr(parent, name, convert_fx(getattr(parent, name)))
+
+    logger.info(f"Quantized {len(blocks)} Wav2Lip blocks to INT8 ({torch.backends.quantized.engine}, "
+                f"{sum(len(mel) for mel, _ in calibration)} calibration samples)")
+    return model